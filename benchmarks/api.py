@@ -0,0 +1,371 @@
+"""
+Latency, throughput and memory of every route of the API, in process through
+the Flask test client and over HTTP under gunicorn, plus micro benchmarks of
+each model's serialize().
+
+The database is seeded with synthetic People, Planet, User and Favorite rows
+(SQLite in a temporary directory unless --database-url points elsewhere). The
+population jobs queued by the run are then drained by the job worker against
+a local SWAPI stub. Results are written as JSON, pass a previous file to
+--compare to see the change per route.
+
+    $ python benchmarks/api.py --rows 100000 --output before.json
+    $ python benchmarks/api.py --rows 100000 --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+GENDERS = ["male", "female", "n/a", "hermaphrodite", "none"]
+EYES = ["blue", "brown", "yellow", "red", "black", "orange", "hazel"]
+CLIMATES = ["arid", "temperate", "frozen", "murky", "tropical"]
+TERRAINS = ["desert", "grasslands", "mountains", "jungle", "tundra", "ocean"]
+UPSTREAM_COUNT = 82
+PAGE_SIZE = 10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000, help="People and Planet rows, 1000 to 1000000")
+    parser.add_argument("--users", type=int, help="User rows, rows / 100 by default")
+    parser.add_argument("--favorites", type=int, default=5, help="favorites per user")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads against gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--mode", choices=["inprocess", "gunicorn", "both"], default="both")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    return parser.parse_args()
+
+
+args = parse_args()
+DATABASE_URL = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+
+from flask_migrate import upgrade  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, People, Planet, Favorite, FavoriteCount, Job, Nature, parse_number, \
+    rebuild_favorite_counts  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+from jobs import run_worker  # noqa: E402
+
+
+def start_upstream():
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            kind = url.path.strip("/").split("/")[-1]
+            page = int(parse_qs(url.query).get("page", ["1"])[0])
+            first = (page - 1) * PAGE_SIZE + 1
+            results = [{"name": f"Upstream {kind} {i}", "height": "172", "mass": "77", "diameter": "10465",
+                        "population": "200000", "url": f"https://swapi.dev/api/{kind}/{i}/"}
+                       for i in range(first, min(first + PAGE_SIZE, UPSTREAM_COUNT + 1))]
+            more = page * PAGE_SIZE < UPSTREAM_COUNT
+            body = json.dumps({"count": UPSTREAM_COUNT, "next": f"?page={page + 1}" if more else None,
+                               "results": results}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def batched_insert(model, rows, batch=50000):
+    for row in rows:
+        # bulk inserts skip the validators that fill the numeric shadow columns
+        for field, shadow in getattr(model, "numeric_fields", {}).items():
+            row[shadow] = parse_number(row.get(field))
+    for start in range(0, len(rows), batch):
+        db.session.execute(db.insert(model), rows[start:start + batch])
+
+
+def seed(rows, users, favorites):
+    rng = random.Random(42)
+    upgrade(directory=os.path.join(ROOT, "migrations"))
+    batched_insert(People, [
+        {"name": f"Person {i}", "height": str(rng.randint(60, 250)),
+         "mass": str(rng.randint(20, 160)), "gender": rng.choice(GENDERS), "eye_color": rng.choice(EYES),
+         "hair_color": "brown", "skin_color": "fair", "birth_year": f"{rng.randint(1, 900)}BBY"}
+        for i in range(rows)
+    ])
+    batched_insert(Planet, [
+        {"name": f"Planet {i}", "climate": rng.choice(CLIMATES), "terrain": rng.choice(TERRAINS),
+         "diameter": str(rng.randint(1000, 200000)), "population": str(rng.randint(0, 10 ** 9)),
+         "rotation_period": str(rng.randint(10, 50)), "orbital_period": str(rng.randint(100, 900)),
+         "gravity": "1 standard", "surface_water": str(rng.randint(0, 100))}
+        for i in range(rows)
+    ])
+    batched_insert(User, [{"fullname": f"User {i}", "email": f"user{i}@example.com"} for i in range(users)])
+    batched_insert(Favorite, [
+        {"user_id": user_id, "nature": nature, "nature_id": nature_id}
+        for user_id in range(1, users + 1)
+        for nature in (Nature.PEOPLE, Nature.PLANET)
+        for nature_id in rng.sample(range(1, rows + 1), min(favorites, rows))
+    ])
+    # the bulk inserts above bypass the flush listener that maintains the counters
+    rebuild_favorite_counts()
+    db.session.commit()
+    if db.engine.dialect.name in ("sqlite", "postgresql"):
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+
+def routes(rows, users):
+    """(name, method, path, json body) factories, called once per request with a random generator."""
+    person = lambda rng: rng.randint(1, rows)
+    user = lambda rng: rng.randint(1, users)
+    return [
+        ("sitemap", lambda rng: ("GET", "/", None)),
+        ("user", lambda rng: ("GET", "/user", None)),
+        ("people list", lambda rng: ("GET", "/people", None)),
+        ("people page", lambda rng: ("GET", f"/people?limit=50&after={person(rng)}", None)),
+        ("people filter", lambda rng: ("GET", f"/people?gender=female&sort=-height&limit=50", None)),
+        ("people search", lambda rng: ("GET", f"/people?search=Person%20{person(rng)}", None)),
+        ("people detail", lambda rng: ("GET", f"/people/{person(rng)}", None)),
+        ("people export", lambda rng: ("GET", "/people/export", None)),
+        ("planets list", lambda rng: ("GET", "/planets", None)),
+        ("planets page", lambda rng: ("GET", f"/planets?limit=50&after={person(rng)}", None)),
+        ("planets detail", lambda rng: ("GET", f"/planets/{person(rng)}", None)),
+        ("planets export", lambda rng: ("GET", "/planets/export", None)),
+        ("population people", lambda rng: ("GET", "/population-people", None)),
+        ("population planet", lambda rng: ("GET", "/population-planet", None)),
+        ("users", lambda rng: ("GET", "/users", None)),
+        ("user favorites", lambda rng: ("GET", "/users/favorites", {"user_id": user(rng)})),
+        ("user favorites hydrated", lambda rng: ("GET", "/users/favorites?hydrate=true", {"user_id": user(rng)})),
+        ("add favorite planet", lambda rng: ("POST", f"/favorite/planet/{person(rng)}", {"user_id": user(rng)})),
+        ("add favorite people", lambda rng: ("POST", f"/favorite/people/{person(rng)}", {"user_id": user(rng)})),
+        ("bulk favorites", lambda rng: ("POST", "/favorites/bulk", {"user_id": user(rng), "operations": [
+            {"op": rng.choice(["add", "remove"]), "nature": rng.choice(["people", "planet"]),
+             "nature_id": person(rng)} for _ in range(20)]})),
+        ("top favorites", lambda rng: ("GET", "/favorites/top?nature=people&limit=10", None)),
+        ("delete favorite planet", lambda rng: ("DELETE", f"/favorite/planet/{person(rng)}", None)),
+        ("delete favorite people", lambda rng: ("DELETE", f"/favorite/people/{person(rng)}", None)),
+        ("cache stats", lambda rng: ("GET", "/cache/stats", None)),
+        ("pool metrics", lambda rng: ("GET", "/metrics/pool", None)),
+        ("metrics", lambda rng: ("GET", "/metrics", None)),
+        ("prueba", lambda rng: ("GET", "/prueba", None)),
+    ]
+
+
+def summarize(latencies, elapsed, statuses, rss_kb):
+    latencies = sorted(latencies)
+    pick = lambda q: round(latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000, 3)
+    return {"requests": len(latencies), "rps": round(len(latencies) / elapsed, 1), "p50_ms": pick(0.5),
+            "p99_ms": pick(0.99), "peak_rss_kb": rss_kb, "statuses": statuses}
+
+
+def count_status(statuses, status):
+    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+
+def self_peak_rss():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_inprocess(route_list, requests):
+    client = app.test_client()
+    results = {}
+    for name, make in route_list:
+        rng = random.Random(name)
+        latencies, statuses = [], {}
+        start = time.perf_counter()
+        for _ in range(requests):
+            method, path, body = make(rng)
+            began = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            latencies.append(time.perf_counter() - began)
+            count_status(statuses, response.status_code)
+        results[name] = summarize(latencies, time.perf_counter() - start, statuses, self_peak_rss())
+        print(f"inprocess {name:26} {results[name]['rps']:9.1f} rps  p50 {results[name]['p50_ms']:8.2f} ms  "
+              f"p99 {results[name]['p99_ms']:8.2f} ms")
+    return results
+
+
+def process_tree_peak_rss(pid):
+    """Sum of VmHWM, the peak resident set, of `pid` and its children; None off Linux."""
+    total, pending = 0, [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as status:
+                total += next(int(line.split()[1]) for line in status if line.startswith("VmHWM"))
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+    except (OSError, StopIteration):
+        return total or None
+    return total
+
+
+def start_gunicorn(port, workers, upstream):
+    import requests as http
+    env = dict(os.environ, SWAPI_BASE_URL=upstream)
+    # started from the repository root so gunicorn.conf.py is picked up, like the Procfile
+    process = subprocess.Popen(["gunicorn", "wsgi", "--chdir", "src", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                                "--timeout", "300"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    for _ in range(100):
+        try:
+            http.get(f"http://127.0.0.1:{port}/cache/stats", timeout=5)
+            return process
+        except http.RequestException:
+            time.sleep(0.1)
+    os.killpg(process.pid, signal.SIGTERM)
+    raise RuntimeError("gunicorn did not start")
+
+
+def run_gunicorn(route_list, requests, concurrency, workers, upstream):
+    import requests as http
+    port = 8900 + os.getpid() % 100
+    process = start_gunicorn(port, workers, upstream)
+    local = threading.local()
+    results = {}
+    try:
+        for name, make in route_list:
+            rng, lock = random.Random(name), threading.Lock()
+
+            def call(_):
+                with lock:
+                    method, path, body = make(rng)
+                session = getattr(local, "session", None) or http.Session()
+                local.session = session
+                began = time.perf_counter()
+                response = session.request(method, f"http://127.0.0.1:{port}{path}", json=body)
+                return time.perf_counter() - began, response.status_code
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(call, range(requests)))
+            elapsed = time.perf_counter() - start
+            statuses = {}
+            for _, status in outcomes:
+                count_status(statuses, status)
+            results[name] = summarize([latency for latency, _ in outcomes], elapsed, statuses,
+                                      process_tree_peak_rss(process.pid))
+            print(f"gunicorn  {name:26} {results[name]['rps']:9.1f} rps  p50 {results[name]['p50_ms']:8.2f} ms  "
+                  f"p99 {results[name]['p99_ms']:8.2f} ms")
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+    return results
+
+
+def micro_serialize(number=2000):
+    """Nanoseconds per serialize() call of an instance of each model, relationships already loaded."""
+    samples = {
+        "User": User.query.options(selectinload(User.favorites)).first(),
+        "People": People.query.first(),
+        "Planet": Planet.query.first(),
+        "Favorite": Favorite.query.first(),
+        "FavoriteCount": FavoriteCount.query.first(),
+    }
+    results = {}
+    for name, instance in samples.items():
+        if instance is None:
+            continue
+        best = min(timeit.repeat(instance.serialize, number=number, repeat=5))
+        results[name] = {"ns_per_call": round(best / number * 1e9, 1)}
+        print(f"serialize {name:14} {results[name]['ns_per_call']:10.1f} ns")
+    return results
+
+
+def drain_jobs():
+    """Run the population jobs the routes queued, like the worker process would."""
+    with app.app_context():
+        queued = Job.query.filter(Job.status == "queued").count()
+        start = time.perf_counter()
+        run_worker(once=True)
+        elapsed = time.perf_counter() - start
+        statuses = {status: count for status, count in
+                    db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status)}
+        db.session.remove()
+    print(f"jobs      drained {queued} queued jobs in {elapsed:.2f}s {statuses}")
+    return {"queued": queued, "seconds": round(elapsed, 3), "statuses": statuses}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, current):
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    print(f"\ncompared to {previous['meta'].get('commit')}")
+    for mode in ("inprocess", "gunicorn"):
+        for name, result in current.get(mode, {}).items():
+            before = previous.get(mode, {}).get(name)
+            if before:
+                print(f"{mode:9} {name:26} rps {before['rps']:9.1f} -> {result['rps']:9.1f}   "
+                      f"p99 {before['p99_ms']:8.2f} -> {result['p99_ms']:8.2f} ms")
+
+
+def main():
+    users = args.users or max(args.rows // 100, 10)
+    upstream = start_upstream()
+    os.environ["SWAPI_BASE_URL"] = upstream
+    import swapi
+    swapi.SWAPI_BASE_URL = upstream
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed(args.rows, users, args.favorites)
+        print(f"seeded {args.rows} people and planets, {users} users in {time.perf_counter() - start:.1f}s")
+        output = {
+            "meta": {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                     "database": db.engine.dialect.name, "rows": args.rows, "users": users,
+                     "favorites_per_user": args.favorites, "requests": args.requests,
+                     "concurrency": args.concurrency, "workers": args.workers,
+                     "python": platform.python_version(), "cpus": os.cpu_count()},
+            "micro": {"serialize": micro_serialize()},
+        }
+        db.session.remove()
+
+    route_list = routes(args.rows, users)
+    if args.mode in ("inprocess", "both"):
+        output["inprocess"] = run_inprocess(route_list, args.requests)
+    if args.mode in ("gunicorn", "both"):
+        output["gunicorn"] = run_gunicorn(route_list, args.requests, args.concurrency, args.workers, upstream)
+    output["jobs"] = drain_jobs()
+
+    with open(args.output, "w") as output_file:
+        json.dump(output, output_file, indent=2)
+    print(f"results written to {args.output}")
+    if args.compare:
+        compare(args.compare, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Throughput and tail latency of gunicorn sync workers against the uvicorn ASGI
+entry point, under many concurrent connections.
+
+    $ python benchmarks/asgi_load.py --connections 1000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import httpx  # noqa: E402
+from flask_migrate import upgrade  # noqa: E402
+from app import app  # noqa: E402
+from models import db, People  # noqa: E402
+
+
+def seed():
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        db.session.execute(db.insert(People), [{"name": f"Seed {i}", "gender": "n/a"} for i in range(100)])
+        db.session.commit()
+
+
+SERVERS = {
+    "gunicorn": lambda port, workers: ["gunicorn", "--chdir", "src", "-w", str(workers), "--backlog", "4096",
+                                       "-b", f"127.0.0.1:{port}", "wsgi:application"],
+    "uvicorn": lambda port, workers: ["uvicorn", "asgi:application", "--app-dir", "src", "--workers",
+                                      str(workers), "--port", str(port), "--log-level", "warning",
+                                      "--no-access-log", "--backlog", "4096"],
+}
+
+
+def start_server(name, port, workers):
+    process = subprocess.Popen(SERVERS[name](port, workers), cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/people/1", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"{name} did not start")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait()
+
+
+async def load(url, connections, requests):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        remaining = iter(range(requests))
+
+        async def user():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(connections)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pick = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0
+    return {"rps": len(latencies) / elapsed, "p50": pick(0.5), "p99": pick(0.99), "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20000, help="requests to /people/1")
+    parser.add_argument("--lists", type=int, default=2000, help="requests to /people")
+    args = parser.parse_args()
+
+    seed()
+    print(f"{'server':10} {'endpoint':20} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for port, name in enumerate(SERVERS, start=8811):
+        process = start_server(name, port, args.workers)
+        try:
+            for path, requests in (("/people/1", args.requests), ("/people", args.lists)):
+                connections = min(args.connections, requests)
+                result = asyncio.run(load(f"http://127.0.0.1:{port}{path}", connections, requests))
+                print(f"{name:10} {path:20} {result['rps']:9.1f} {result['p50']:9.1f} {result['p99']:9.1f} "
+                      f"{result['errors']:7}")
+        finally:
+            stop_server(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Latency of the /people filters and name search on a synthetic catalog,
+next to the same predicates evaluated with a full table scan.
+
+    $ python benchmarks/search.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from flask_migrate import upgrade  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from app import app  # noqa: E402
+from models import db, People  # noqa: E402
+
+SYLLABLES = ["lu", "ke", "sky", "wal", "ker", "lei", "a", "or", "ga", "na", "dar", "th", "han", "so", "lo"]
+GENDERS = ["male", "female", "n/a", "hermaphrodite", "none"]
+EYES = ["blue", "brown", "yellow", "red", "black", "orange", "hazel", "pink", "green", "white"]
+
+QUERIES = [
+    ("gender=female&eye_color=gold", "SELECT id FROM people WHERE +gender = 'female' AND +eye_color = 'gold' LIMIT 51"),
+    ("search=vad", "SELECT id FROM people WHERE name LIKE '%vad%' LIMIT 51"),
+    ("search=darth%20vader", "SELECT id FROM people WHERE name LIKE '%darth%' AND name LIKE '%vader%' LIMIT 51"),
+]
+
+
+def fake_name(rng):
+    return " ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize() for _ in range(2))
+
+
+def seed(rows, batch=50000):
+    rng = random.Random(42)
+    for start in range(0, rows, batch):
+        db.session.execute(db.insert(People), [
+            # gold eyes are rare so the filter is selective, like most real lookups
+            {"name": fake_name(rng), "gender": rng.choice(GENDERS),
+             "eye_color": "gold" if rng.random() < 0.0005 else rng.choice(EYES),
+             "hair_color": "brown", "skin_color": "fair"}
+            for _ in range(min(batch, rows - start))
+        ])
+    db.session.execute(db.insert(People), [{"name": "Darth Vader", "gender": "male", "eye_color": "yellow"}])
+    db.session.execute(db.insert(People), [{"name": "Vadim Vadersson", "gender": "male", "eye_color": "blue"}])
+    db.session.commit()
+    # planner statistics, so SQLite picks the most selective filter index
+    db.session.execute(text("ANALYZE"))
+
+
+def timed(function, repeat):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        start = time.perf_counter()
+        seed(args.rows)
+        print(f"seeded {args.rows} people in {time.perf_counter() - start:.1f}s")
+
+        client = app.test_client()
+        print(f"{'query':32} {'endpoint ms':>12} {'full scan ms':>13}")
+        for query, scan in QUERIES:
+            endpoint = timed(lambda: client.get(f"/people?{query}&limit=50"), args.repeat)
+            baseline = timed(lambda: db.session.execute(text(scan)).all(), args.repeat)
+            print(f"{query:32} {endpoint:12.2f} {baseline:13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Requests per second of the /people list rendered the old way (ORM instances,
+serialize() and the stdlib JSON provider) and through the column tuple path
+with the orjson provider.
+
+    $ python benchmarks/serialization.py --rows 10000 --requests 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from app import app  # noqa: E402
+from models import db, People  # noqa: E402
+from utils import serialize_rows  # noqa: E402
+
+
+def seed(rows):
+    db.create_all()
+    db.session.execute(db.insert(People), [
+        {"name": f"Person {i}", "height": str(150 + i % 60), "mass": str(50 + i % 70), "hair_color": "brown",
+         "skin_color": "fair", "eye_color": "blue", "birth_year": f"{i % 100}BBY", "gender": "n/a"}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+stdlib_json = DefaultJSONProvider(app)
+
+
+@app.route("/bench/before")
+def bench_before():
+    return stdlib_json.response([person.serialize() for person in People.query.all()])
+
+
+@app.route("/bench/after")
+def bench_after():
+    return app.json.response(serialize_rows(db.session, People))
+
+
+def measure(client, url, requests):
+    client.get(url)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.rows)
+    client = app.test_client()
+    before = measure(client, "/bench/before", args.requests)
+    after = measure(client, "/bench/after", args.requests)
+    print(f"rows={args.rows} json={type(app.json).__name__}")
+    print(f"before: {before:8.1f} req/s")
+    print(f"after:  {after:8.1f} req/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
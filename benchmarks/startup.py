@@ -0,0 +1,82 @@
+"""
+Cold start of a worker: time to import the wsgi entry point and latency of
+the first requests, for each boot profile (APP_PROFILE=full or api). Every
+sample runs in a fresh interpreter, like a worker spawned after scale to zero.
+
+    $ python benchmarks/startup.py --runs 10
+    $ python benchmarks/startup.py --importtime   # slowest imports per profile
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC = os.path.join(ROOT, "src")
+PROFILES = ["full", "api"]
+
+# runs inside the child interpreter, prints one JSON line of timings in ms
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+client = wsgi.application.test_client()
+timings = {"import_ms": (imported - start) * 1000}
+for path in ("/people/1", "/people"):
+    began = time.perf_counter()
+    status = client.get(path).status_code
+    timings[f"first {path} ms"] = (time.perf_counter() - began) * 1000
+    assert status in (200, 404), status
+timings["total_ms"] = (time.perf_counter() - start) * 1000
+print(json.dumps(timings))
+"""
+
+
+def prepare_database():
+    path = os.path.join(tempfile.mkdtemp(), "startup.db")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    subprocess.run([sys.executable, "-c", "from app import app, db\nwith app.app_context(): db.create_all()"],
+                   cwd=SRC, env=env, check=True, capture_output=True)
+    return env["DATABASE_URL"]
+
+
+def sample(profile, database_url, importtime=False):
+    env = dict(os.environ, APP_PROFILE=profile, DATABASE_URL=database_url, REQUEST_LOG_LEVEL="WARNING")
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    result = subprocess.run(command, cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """Top level packages by import time spent in their own modules, from -X importtime output."""
+    packages = {}
+    for match in re.finditer(r"import time:\s+(\d+) \|\s+\d+ \| *(\S+)", stderr):
+        package = match.group(2).split(".")[0]
+        packages[package] = packages.get(package, 0) + int(match.group(1))
+    return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    database_url = prepare_database()
+    for profile in PROFILES:
+        if args.importtime:
+            _, stderr = sample(profile, database_url, importtime=True)
+            print(f"{profile}: " + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in slowest_imports(stderr, 10)))
+            continue
+        runs = [sample(profile, database_url)[0] for _ in range(args.runs)]
+        medians = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+        print(f"{profile:5} " + "  ".join(f"{name} {value:7.1f}" for name, value in medians.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# Picked up automatically by `gunicorn wsgi --chdir ./src/` (see Procfile).
+import sys
+
+
+def post_fork(server, worker):
+    # with --preload the app and its warmed pool were created in the master;
+    # every worker drops the inherited sockets and warms its own pool
+    wsgi = sys.modules.get("wsgi")
+    if wsgi is None:
+        return
+    from pool import warm_pool
+    with wsgi.application.app_context():
+        for replica in wsgi.application.extensions.get("db_replicas", []):
+            replica.dispose(close=False)
+        engine = wsgi.db.engine
+        engine.dispose(close=False)
+        warm_pool(engine)
@@ -0,0 +1,43 @@
+"""fold user_favorites into favorite
+
+Revision ID: b466af084580
+Revises: 6cf975b82da2
+Create Date: 2026-10-18 10:57:11.204695
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b466af084580'
+down_revision = '6cf975b82da2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Data only: user_favorites stays in place so workers still running the previous
+    # release keep working during the deploy. Links that point a user at a favorite
+    # owned by someone else become that user's own favorite row.
+    op.execute(
+        "INSERT INTO favorite (nature, nature_id, user_id) "
+        "SELECT DISTINCT f.nature, f.nature_id, uf.user_id "
+        "FROM user_favorites uf JOIN favorite f ON f.id = uf.favorite_id "
+        "WHERE NOT EXISTS ("
+        "SELECT 1 FROM favorite e "
+        "WHERE e.user_id = uf.user_id AND e.nature = f.nature AND e.nature_id = f.nature_id)"
+    )
+    op.execute(
+        "UPDATE table_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP "
+        "WHERE table_name IN ('favorite', 'user')"
+    )
+
+
+def downgrade():
+    # give every favorite its association row back for the previous release
+    op.execute(
+        "INSERT INTO user_favorites (user_id, favorite_id) "
+        "SELECT f.user_id, f.id FROM favorite f "
+        "WHERE NOT EXISTS ("
+        "SELECT 1 FROM user_favorites uf WHERE uf.user_id = f.user_id AND uf.favorite_id = f.id)"
+    )
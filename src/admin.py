@@ -3,6 +3,14 @@ from flask_admin import Admin
 from models import db, User, People, Planet, Favorite
 from flask_admin.contrib.sqla import ModelView
 
+
+class CatalogView(ModelView):
+    # filled by the SWAPI sync and the numeric validators, not edited by hand;
+    # flask-admin's Unique validator for swapi_url also breaks on WTForms 3
+    form_excluded_columns = ['swapi_url', 'content_hash', 'height_num', 'mass_num', 'rotation_period_num',
+                             'orbital_period_num', 'diameter_num', 'population_num']
+
+
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
@@ -11,8 +19,8 @@ def setup_admin(app):
     
     # Add your models here, for example this is how we add a the User model to the admin
     admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(People, db.session))
-    admin.add_view(ModelView(Planet, db.session))
+    admin.add_view(CatalogView(People, db.session))
+    admin.add_view(CatalogView(Planet, db.session))
     admin.add_view(ModelView(Favorite, db.session))
 
     # You can duplicate that line to add mew models
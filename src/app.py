@@ -1,20 +1,36 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
+import logging
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import click
+from flask import Flask, Response, request, jsonify, url_for, stream_with_context
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, People, Planet, Favorite, user_favorites
+from utils import APIException, generate_sitemap, keyset_page, is_paginated, export_rows
+from instrumentation import setup_instrumentation, render_metrics
+from versions import setup_versions, conditional_get
+from compression import setup_compression
+from json_provider import setup_json
+from counters import setup_counters
+from pool import engine_options, pool_stats
+from replicas import setup_replicas, use_primary
+from search import list_conditions, list_sort, is_filtered
+from cache import setup_cache, cached_entity, cached_list, cache_stats
+from snapshot import setup_snapshot, snapshot_list
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, User, People, Planet, Favorite, user_favorites, hydrate_favorites, apply_favorite_operations, \
+    FavoriteCount, Nature, NATURE_MODELS, rebuild_favorite_counts, Job
 #from models import Person
-import requests
+from jobs import enqueue, run_worker, start_worker_thread, JOB_WORKER_IN_PROCESS
 
 
+# "api" boots only what the API routes need: no /admin, no `flask db` commands
+APP_PROFILE = os.getenv("APP_PROFILE", "full")
+
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+setup_json(app)
 
 db_url = os.getenv("DATABASE_URL")
 if db_url is not None:
@@ -22,11 +38,31 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-MIGRATE = Migrate(app, db)
+if APP_PROFILE != "api":
+    # alembic and flask-admin are the slowest imports of the app, API workers never use them
+    from flask_migrate import Migrate
+    from admin import setup_admin
+    MIGRATE = Migrate(app, db)
 db.init_app(app)
+setup_replicas(app)
 CORS(app)
-setup_admin(app)
+if APP_PROFILE != "api":
+    setup_admin(app)
+setup_instrumentation(app)
+setup_versions()
+setup_counters()
+setup_cache()
+setup_snapshot(app)
+setup_compression(app)
+
+if JOB_WORKER_IN_PROCESS:
+    @app.before_request
+    def start_job_worker():
+        # on the first request, so only serving processes run it, never a preloading gunicorn master
+        start_worker_thread(app)
+
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -49,103 +85,125 @@ def handle_hello():
 
 
 @app.route("/people", methods=["GET"])
+@snapshot_list("people")
+@conditional_get("people")
 def get_all_people():
+    if is_paginated(request.args) or is_filtered(People, request.args):
+        conditions = list_conditions(db.session, People, request.args)
+        sort = list_sort(People, request.args)
+        return jsonify(keyset_page(db.session, People, request.args, conditions, sort)), 200
     try:
-        people = People.query.all()
-        return jsonify([person.serialize() for person in people]), 200
+        return jsonify(cached_list(People)), 200
     except Exception as err:
         return jsonify(f"Error: {err.args}")
 
 
 @app.route("/people/<int:people_id>", methods=["GET"])
+@conditional_get("people")
 def get_one_people(people_id=None):
     try:
-        people = People.query.get(people_id)
+        people = cached_entity(People, people_id)
         if people is None:
             return jsonify(f"User {people_id} not found"), 404
         else:
-            return jsonify(people.serialize())
+            return jsonify(people)
     except Exception as err:
         return jsonify(f"Error: {err.args}"), 500
 
 
+@app.route("/people/export", methods=["GET"])
+def export_people():
+    return export_table(People)
+
+
 @app.route("/planets", methods=["GET"])
+@snapshot_list("planet")
+@conditional_get("planet")
 def get_all_planets():
+    if is_paginated(request.args) or is_filtered(Planet, request.args):
+        conditions = list_conditions(db.session, Planet, request.args)
+        sort = list_sort(Planet, request.args)
+        return jsonify(keyset_page(db.session, Planet, request.args, conditions, sort)), 200
     try:
-        planet = Planet.query.all()
-        return jsonify([planet.serialize() for planet in planet]), 200
+        return jsonify(cached_list(Planet)), 200
     except Exception as err:
         return jsonify(f"Error: {err.args}")
 
 
 @app.route("/planets/<int:planet_id>", methods=["GET"])
+@conditional_get("planet")
 def get_one_planet(planet_id=None):
     try:
-        planet = Planet.query.get(planet_id)
+        planet = cached_entity(Planet, planet_id)
         if planet is None:
             return jsonify(f"User {planet_id} not found"), 404
         else:
-            return jsonify(planet.serialize())
+            return jsonify(planet)
     except Exception as err:
         return jsonify(f"Error: {err.args}"), 500
 
 
+@app.route("/planets/export", methods=["GET"])
+def export_planets():
+    return export_table(Planet)
+
+
+def export_table(model):
+    if request.args.get("format", "ndjson") != "ndjson":
+        raise APIException("Only format=ndjson is supported", status_code=400)
+    return Response(stream_with_context(export_rows(db.session, model)), mimetype="application/x-ndjson")
+
 
-@app.route("/population-people", methods=["GET"])
+@app.route("/population-people", methods=["GET", "POST"])
+@use_primary
 def population_people():
-    try:
-        response = requests.get("https://swapi.dev/api/people")
-        response = response.json()["results"]
-        for person in response:
-            people = People(
-                name=person["name"],
-                height=person["height"],
-                mass=person["mass"],
-                hair_color=person["hair_color"],
-                skin_color=person["skin_color"] ,
-                eye_color=person["eye_color"],
-                birth_year=person["birth_year"],
-                gender=person["gender"],
-                
-            )
-            db.session.add(people)
-        db.session.commit()
+    return enqueue_population("population-people")
 
-        return jsonify("Los personajes se crearon exitosamente"), 200
-    except Exception as err:
-        return jsonify(f"Error: {err.args}"), 500 
-    
 
-@app.route("/population-planet", methods=["GET"])
+@app.route("/population-planet", methods=["GET", "POST"])
+@use_primary
 def population_planet():
-    try:
-        response = requests.get("https://swapi.dev/api/planets")
-        response = response.json()["results"]
-        for planet in response:
-            planet = Planet(
-                name=planet["name"],
-                rotation_period=planet["rotation_period"],
-                orbital_period=planet["orbital_period"],
-                diameter=planet["diameter"],
-                climate=planet["climate"] ,
-                gravity=planet["gravity"],
-                terrain=planet["terrain"],
-                surface_water=planet["surface_water"],
-                population=planet["population"],
-                
-            )
-            db.session.add(planet)
-        db.session.commit()
+    return enqueue_population("population-planet")
 
-        return jsonify("Los planets se crearon exitosamente"), 200
+
+def enqueue_population(kind):
+    # the sync runs in the job worker (`flask run-jobs`), poll /jobs/<id> for its progress
+    try:
+        job = enqueue(kind)
+        response = jsonify({"message": "Sincronizacion en cola", "job": job.serialize()})
+        response.headers["Location"] = url_for("get_job", job_id=job.id)
+        return response, 202
     except Exception as err:
-        return jsonify(f"Error: {err.args}"), 500 
+        db.session.rollback()
+        return jsonify(f"Error: {err.args}"), 500
+
+
+@app.route("/jobs", methods=["GET"])
+def get_jobs():
+    query = Job.query
+    if request.args.get("status"):
+        query = query.filter(Job.status == request.args["status"])
+    try:
+        limit = max(min(int(request.args.get("limit", 50)), 500), 1)
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+    return jsonify([job.serialize() for job in query.order_by(Job.id.desc()).limit(limit)]), 200
+
+
+@app.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id=None):
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({"message": f"Job {job_id} not found"}), 404
+    return jsonify(job.serialize()), 200
 
 
 @app.route("/users", methods=["GET"])
+@conditional_get("user", "favorite")
 def get_all_users():
     try:
-        users = User.query.all()
+        # favorites for every user come from a single extra SELECT ... IN
+        users = User.query.options(selectinload(User.favorites)).all()
         return jsonify([user.serialize() for user in users]), 200
     except Exception as err:
         return jsonify(f"Error: {err}")
@@ -156,9 +214,10 @@ def get_user_favorites():
     try:
         body = request.json
 
-        user = User()
-        user = user.query.get(body["user_id"])
+        user = User.query.options(joinedload(User.favorites)).get(body["user_id"])
 
+        if request.args.get("hydrate") == "true":
+            return jsonify({**user.serialize(), "favorites": hydrate_favorites(user.favorites)}), 200
         return jsonify(user.serialize()),200
     except Exception as err:
         return jsonify(f"Error: {err.args}"), 500
@@ -183,13 +242,12 @@ def add_favorites_planet(planet_id=None):
         
         db.session.add(favorite) 
         db.session.commit() 
-        
-        # Añadir la relación en la tabla de asociación 
-        user.favorites.append(favorite) 
-        db.session.commit() 
 
         return jsonify({"message": "Planet save success"}), 201
     
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": f"Planet {planet_id} is already a favorite"}), 409
     except Exception as err:
         return jsonify(f"Error: {err.args}"), 500
     
@@ -214,17 +272,58 @@ def add_favorites_prople(people_id=None):
         
         db.session.add(favorite) 
         db.session.commit() 
-        
-        # Añadir la relación en la tabla de asociación 
-        user.favorites.append(favorite) 
-        db.session.commit() 
         return jsonify({"message": "People save successfully"}), 201
 
 
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": f"People {people_id} is already a favorite"}), 409
     except Exception as err:
         return jsonify(f"Error: {err.args}"), 500
     
 
+@app.route("/favorites/bulk", methods=["POST"])
+def bulk_favorites():
+    try:
+        body = request.json
+        user_id = body.get("user_id")
+        operations = body.get("operations")
+
+        if not user_id or not isinstance(operations, list):
+            return jsonify({"message": "user_id and a list of operations are required"}), 400
+        if User.query.get(user_id) is None:
+            return jsonify({"message": f"User {user_id} not found"}), 404
+
+        results = apply_favorite_operations(user_id, operations)
+        db.session.commit()
+        return jsonify({"results": results}), 200
+
+    except Exception as err:
+        db.session.rollback()
+        return jsonify(f"Error: {err.args}"), 500
+
+
+@app.route("/favorites/top", methods=["GET"])
+@conditional_get("favorite", "people", "planet")
+def top_favorites():
+    try:
+        nature = Nature[request.args.get("nature", "people").upper()]
+        limit = min(int(request.args.get("limit", 10)), 100)
+        if limit < 1:
+            raise ValueError(limit)
+    except (KeyError, ValueError):
+        return jsonify({"message": "nature must be people or planet and limit a positive integer"}), 400
+    try:
+        # served by ix_favorite_count_nature_count, no GROUP BY over favorite
+        counts = FavoriteCount.query.filter(FavoriteCount.nature == nature, FavoriteCount.count > 0) \
+            .order_by(FavoriteCount.count.desc()).limit(limit).all()
+        model = NATURE_MODELS[nature]
+        records = {item.id: item.serialize() for item in model.query.filter(model.id.in_([count.nature_id for count in counts]))}
+        return jsonify([{**count.serialize(), "record": records.get(count.nature_id)} for count in counts]), 200
+    except Exception as err:
+        return jsonify(f"Error: {err.args}"), 500
+
+
 @app.route("/favorite/<string:planet_nature>/<int:planet_id>", methods=["DELETE"])
 def delete_planet_on_fav(planet_id=None, planet_nature=None):
     try:
@@ -234,6 +333,8 @@ def delete_planet_on_fav(planet_id=None, planet_nature=None):
         if favorite is None:
             return jsonify({"message":f"Favorite {planet_nature} with id {planet_id} not found"}), 404 
         else:
+            # legacy association rows still reference the favorite until user_favorites is dropped
+            db.session.execute(user_favorites.delete().where(user_favorites.c.favorite_id == favorite.id))
             db.session.delete(favorite)
             db.session.commit()
             return jsonify("trabajando por usted"), 204
@@ -250,6 +351,8 @@ def delete_people_on_fav(people_id=None, people_nature=None):
         if favorite is None:
             return jsonify({"message":f"Favorite {people_nature} with id {people_id} not found"}), 404 
         else:
+            # legacy association rows still reference the favorite until user_favorites is dropped
+            db.session.execute(user_favorites.delete().where(user_favorites.c.favorite_id == favorite.id))
             db.session.delete(favorite)
             db.session.commit()
             return jsonify("trabajando por usted"), 204
@@ -258,6 +361,27 @@ def delete_people_on_fav(people_id=None, people_nature=None):
         return jsonify({"message":f"Error: {err.args}"})
 
 
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats()), 200
+
+
+@app.route("/metrics/pool", methods=["GET"])
+def get_pool_stats():
+    return jsonify(pool_stats(db.engine)), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    pool = pool_stats(db.engine)
+    gauges = [(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}.", value)
+              for name, value in pool.items() if isinstance(value, (int, float))]
+    cache = cache_stats()
+    gauges += [(f"cache_{name}", f"Response cache {name}.", value)
+               for name, value in cache.items() if isinstance(value, int)]
+    return Response(render_metrics(gauges), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/prueba")
 def prueba():
     try:
@@ -268,6 +392,22 @@ def prueba():
         return jsonify(err.args), 500
 
 
+@app.cli.command("rebuild-favorite-counts")
+def rebuild_favorite_counts_command():
+    """Recompute the favorite counters from the favorite table."""
+    rebuild_favorite_counts()
+    db.session.commit()
+    print(f"Rebuilt {FavoriteCount.query.count()} favorite counters")
+
+
+@app.cli.command("run-jobs")
+@click.option("--once", is_flag=True, help="Exit when no job is due instead of waiting for more.")
+def run_jobs_command(once):
+    """Run the background job worker."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    run_worker(once=once)
+
+
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
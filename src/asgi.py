@@ -0,0 +1,210 @@
+"""
+ASGI entry point, an alternative to wsgi.py for IO bound deployments:
+
+    $ uvicorn asgi:application --app-dir src --workers 4
+
+The catalog reads run as native async views on an async SQLAlchemy engine
+(asyncpg / aiosqlite), so a worker keeps serving other requests while it waits
+on the database. They send the same ETag, Last-Modified, Server-Timing and
+X-Query-Count headers as the Flask views. Every other route, any request using
+query parameters or conditional headers, and the lists when SNAPSHOT_DIR is
+set, is served by the regular Flask app.
+"""
+import contextlib
+import time
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Match, Route
+from werkzeug.datastructures import Accept
+from werkzeug.http import http_date, parse_accept_header, quote_etag
+from app import app as flask_app
+from instrumentation import record_request
+from models import People, Planet
+from pool import engine_options
+from utils import serialize_fields
+import cache
+import compression
+import snapshot
+import versions
+
+DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_engine_options(url):
+    options = engine_options(url)
+    if options.pop("poolclass", None) is not None:
+        # same sizing as the sync pool, on the queue pool made for asyncio drivers
+        options["poolclass"] = AsyncAdaptedQueuePool
+    connect_args = options.pop("connect_args", {})
+    if "options" in connect_args:
+        # asyncpg takes server settings instead of a libpq options string
+        timeout = connect_args["options"].split("=", 1)[1]
+        options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+    return options
+
+
+def async_url(url):
+    scheme, rest = url.split("://", 1)
+    return f"{DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+database_url = flask_app.config["SQLALCHEMY_DATABASE_URI"]
+engine = create_async_engine(async_url(database_url), **async_engine_options(database_url))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+class Timings:
+    """SQL and JSON encoding time of one native request, reported like the Flask ones."""
+
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+    async def query(self, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+def json_response(payload, request, timings, status_code=200, etag=None, last_modified=None):
+    start = time.perf_counter()
+    body = (flask_app.json.dumps(payload) + "\n").encode("utf-8")
+    timings.serialize_time += time.perf_counter() - start
+    headers = {"Vary": "Accept-Encoding"}
+    accept = parse_accept_header(request.headers.get("accept-encoding"), Accept)
+    encoding = compression.choose_encoding(accept)
+    if encoding is not None and len(body) >= compression.COMPRESS_MIN_SIZE:
+        body = compression.compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        etag = f"{etag}-{encoding}" if etag else None
+    if etag:
+        headers["ETag"] = quote_etag(etag)
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    headers.update(record_request(request.method, request.url.path, timings.route, status_code, timings.queries,
+                                  timings.db_time, timings.serialize_time, time.perf_counter() - timings.start))
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+async def select_rows(session, timings, model, entity_id=None):
+    names = serialize_fields(model)
+    columns = model.__table__.columns
+    stmt = select(*[columns[name] for name in names]).order_by(model.id)
+    if entity_id is not None:
+        stmt = stmt.where(model.id == entity_id)
+    rows = (await timings.query(session.execute(stmt))).all()
+    return [dict(zip(names, row)) for row in rows]
+
+
+async def table_state(session, timings, table):
+    """The ETag, Last-Modified and cache key version of `table`, all from one table_version read."""
+    rows = await timings.query(session.run_sync(versions.version_rows, [table]))
+    etag, last_modified = versions.table_state(session, [table], rows)
+    return etag, last_modified, cache.version_key(*rows.get(table, (0, None)))
+
+
+async def call_backend(method, *args):
+    if isinstance(cache.backend, cache.LocalCache):
+        # in process and never blocks, a thread hop would cost more than the lookup
+        return method(*args)
+    return await run_in_threadpool(method, *args)
+
+
+async def cached(key, loader):
+    """Async twin of cache.cached, redis calls run in a thread so they don't block the loop."""
+    payload = await call_backend(cache.backend.get, key)
+    if payload is None:
+        payload = await loader()
+        if payload is not None:
+            await call_backend(cache.backend.set, key, payload)
+    return payload
+
+
+def list_view(model, route):
+    table = model.__tablename__
+
+    async def view(request):
+        timings = Timings(route)
+        async with Session() as session:
+            etag, last_modified, version = await table_state(session, timings, table)
+            payload = await cached(f"{table}:{version}:all", lambda: select_rows(session, timings, model))
+        return json_response(payload, request, timings, etag=etag, last_modified=last_modified)
+    return view
+
+
+def detail_view(model, route):
+    table = model.__tablename__
+
+    async def view(request):
+        timings = Timings(route)
+        entity_id = request.path_params["entity_id"]
+
+        async def load(session):
+            rows = await select_rows(session, timings, model, entity_id)
+            return rows[0] if rows else None
+
+        try:
+            async with Session() as session:
+                etag, last_modified, version = await table_state(session, timings, table)
+                payload = await cached(f"{table}:{version}:id:{entity_id}", lambda: load(session))
+            if payload is None:
+                return json_response(f"User {entity_id} not found", request, timings, 404)
+            return json_response(payload, request, timings, etag=etag, last_modified=last_modified)
+        except Exception as err:
+            return json_response(f"Error: {err.args}", request, timings, 500)
+    return view
+
+
+# the route labels are the Flask rules, so both entry points share their metrics series
+list_routes = [
+    Route("/people", list_view(People, "/people")),
+    Route("/planets", list_view(Planet, "/planets")),
+]
+routes = list_routes + [
+    Route("/people/{entity_id:int}", detail_view(People, "/people/<int:people_id>")),
+    Route("/planets/{entity_id:int}", detail_view(Planet, "/planets/<int:planet_id>")),
+]
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+# CORS(app) in app.py allows every origin, echoing it back with Vary: Origin, the native views do the same
+native = Starlette(routes=routes, lifespan=lifespan,
+                   middleware=[Middleware(CORSMiddleware, allow_origin_regex=".*", allow_methods=["GET"])])
+fallback = WSGIMiddleware(flask_app)
+CONDITIONAL_HEADERS = (b"if-none-match", b"if-modified-since")
+
+
+def is_native(scope):
+    if scope["type"] != "http" or scope["method"] != "GET" or scope["query_string"]:
+        return False
+    if any(name in CONDITIONAL_HEADERS for name, value in scope["headers"]):
+        return False
+    if snapshot.store is not None and any(route.matches(scope)[0] == Match.FULL for route in list_routes):
+        # with SNAPSHOT_DIR the lists come from the snapshot files the Flask views serve
+        return False
+    return any(route.matches(scope)[0] == Match.FULL for route in routes)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan" or is_native(scope):
+        await native(scope, receive, send)
+    else:
+        await fallback(scope, receive, send)
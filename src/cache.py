@@ -0,0 +1,149 @@
+"""
+Read-through cache for serialized list and single entity payloads.
+
+Keys carry the table's row in `table_version` (`people:<version>:id:1`), read
+through the same session, and so from the same primary or replica, as the
+cached rows. Every commit that touches a table bumps that row, whichever
+process makes it, so stale entries are never read again and simply age out,
+and a lagging replica only ever fills the keys of the version it has. A
+request reuses the row its ETag was computed from (see versions.conditional_get).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import versions
+from models import db
+from utils import serialize_rows
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", 4096))
+CACHE_TTL = int(os.getenv("CACHE_TTL", 300))
+
+
+class LocalCache:
+    """Thread safe LRU cache whose entries also expire after `ttl` seconds, private to its process."""
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache:
+    """Cache stored in any server speaking the redis protocol, shared by all workers."""
+
+    def __init__(self, client, ttl=CACHE_TTL, prefix="swcache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+backend = LocalCache()
+
+
+def make_backend(url):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return RedisCache(redis.Redis.from_url(url))
+    if url.startswith("memory://"):
+        return LocalCache()
+    raise ValueError(f"Unsupported CACHE_URL {url}")
+
+
+def version_key(version, updated_at):
+    # the timestamp keeps a recreated database from reusing the keys of an old one
+    return f"{version}.{updated_at:%Y%m%d%H%M%S%f}" if updated_at else str(version)
+
+
+def table_version(table):
+    """Cache key part for the current version of `table`, as seen by db.session."""
+    return version_key(*versions.current_versions(db.session, [table])[table])
+
+
+def cached(table, name, loader):
+    """Return the payload cached under `name` for the current version of `table`,
+    calling `loader` on a miss. None results are not cached."""
+    if table in db.session.info.get("changed_tables", ()):
+        # this transaction's own writes are not committed yet, nor versioned
+        return loader()
+    key = f"{table}:{table_version(table)}:{name}"
+    payload = backend.get(key)
+    if payload is None:
+        payload = loader()
+        if payload is not None:
+            backend.set(key, payload)
+    return payload
+
+
+def cached_entity(model, entity_id):
+    """Return the serialized `model` row with `entity_id`, or None if it does not exist."""
+    def load():
+        instance = model.query.get(entity_id)
+        return instance.serialize() if instance is not None else None
+    return cached(model.__tablename__, f"id:{entity_id}", load)
+
+
+def cached_list(model):
+    """Return every serialized `model` row ordered by id."""
+    return cached(model.__tablename__, "all", lambda: serialize_rows(db.session, model))
+
+
+def cache_stats():
+    return backend.stats()
+
+
+def setup_cache(url=CACHE_URL):
+    global backend
+    backend = make_backend(url)
@@ -0,0 +1,88 @@
+"""
+Content negotiated gzip/brotli compression for JSON and NDJSON responses
+"""
+import gzip
+import os
+import zlib
+from flask import request
+from cache import LocalCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+COMPRESSIBLE = {"application/json", "application/x-ndjson", "text/html", "text/plain"}
+
+# compressed bodies keyed by (path, etag, encoding), the etag changes with every write
+compressed_cache = LocalCache(maxsize=256)
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings):
+    for encoding in available_encodings():
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=min(COMPRESS_LEVEL, 11))
+        for chunk in chunks:
+            yield compressor.process(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        yield compressor.flush()
+
+
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        etag, weak = response.get_etag()
+        key = (request.full_path, etag, encoding) if etag else None
+        body = compressed_cache.get(key) if key else None
+        if body is None:
+            body = compress(data, encoding)
+            if key:
+                compressed_cache.set(key, body)
+        response.set_data(body)
+        if etag:
+            # every encoding is a different representation, so it gets its own strong etag
+            response.set_etag(f"{etag}-{encoding}", weak)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def setup_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,40 @@
+"""
+Keeps favorite_count in step with favorites written through the ORM unit of work
+(single favorite endpoints, deletes and Flask-Admin). Bulk statements update the
+counters themselves, see apply_favorite_operations.
+"""
+from collections import defaultdict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Favorite, Nature, apply_count_deltas
+
+
+def key(nature, nature_id):
+    # favorites built by hand may carry the enum name instead of the member
+    return (Nature[nature] if isinstance(nature, str) else nature, nature_id)
+
+
+def count_flushed(session, flush_context):
+    deltas = defaultdict(int)
+    for favorite in session.new:
+        if isinstance(favorite, Favorite):
+            deltas[key(favorite.nature, favorite.nature_id)] += 1
+    for favorite in session.deleted:
+        if isinstance(favorite, Favorite):
+            deltas[key(favorite.nature, favorite.nature_id)] -= 1
+    for favorite in session.dirty:
+        if not isinstance(favorite, Favorite):
+            continue
+        state = inspect(favorite)
+        nature, nature_id = state.attrs.nature.history, state.attrs.nature_id.history
+        if nature.has_changes() or nature_id.has_changes():
+            old_nature = (nature.deleted or nature.unchanged or [favorite.nature])[0]
+            old_nature_id = (nature_id.deleted or nature_id.unchanged or [favorite.nature_id])[0]
+            deltas[key(old_nature, old_nature_id)] -= 1
+            deltas[key(favorite.nature, favorite.nature_id)] += 1
+    if deltas:
+        apply_count_deltas(session.connection(), deltas)
+
+
+def setup_counters():
+    event.listen(Session, "after_flush", count_flushed)
@@ -0,0 +1,169 @@
+"""
+Per request profiling.
+
+Every request records its SQL statement count and time, the time spent
+encoding JSON and the total time. They are sent back in the X-Query-Count and
+Server-Timing headers, logged as one JSON line on the `api.requests` logger and
+aggregated into Prometheus histograms served by /metrics.
+
+The histograms live in the worker process, each gunicorn worker reports its
+own; scrape them per worker or use a single worker behind the scraper.
+"""
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+logger = logging.getLogger("api.requests")
+
+
+class Histogram:
+    """Prometheus histogram, one series per label tuple."""
+
+    def __init__(self, name, help_text, labels, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            counts, total = self.series.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.series[label_values] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self.series.items())
+        for label_values, counts, total in series:
+            labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_seconds = Histogram("http_request_duration_seconds", "Time spent serving a request.",
+                            ("method", "route", "status"))
+db_seconds = Histogram("http_request_db_seconds", "Time spent in SQL statements per request.",
+                       ("method", "route"))
+query_count = Histogram("http_request_queries", "SQL statements executed per request.",
+                        ("method", "route"), buckets=(0, 1, 2, 5, 10, 25, 50, 100))
+
+
+def before_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        # counted up front, a failing statement is still a statement
+        g.query_count = g.get("query_count", 0) + 1
+        if context is not None:
+            # on the execution context, not the pooled connection, so nothing outlives the statement
+            context.query_start = time.perf_counter()
+
+
+def record_query_time(context):
+    start = getattr(context, "query_start", None)
+    if start is not None and has_request_context():
+        context.query_start = None
+        g.db_time = g.get("db_time", 0.0) + time.perf_counter() - start
+
+
+def after_query(conn, cursor, statement, parameters, context, executemany):
+    record_query_time(context)
+
+
+def failed_query(exception_context):
+    record_query_time(exception_context.execution_context)
+
+
+def timed_serialization(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not has_request_context() or g.get("serializing"):
+            return method(*args, **kwargs)
+        g.serializing = True
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            g.serializing = False
+            g.serialize_time = g.get("serialize_time", 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+def route_label():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def render_metrics(gauges=()):
+    """Prometheus text exposition of the request histograms plus `gauges`, (name, help, value) tuples."""
+    lines = []
+    for histogram in (request_seconds, db_seconds, query_count):
+        lines.extend(histogram.render())
+    for name, help_text, value in gauges:
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
+
+
+def record_request(method, path, route, status, queries, db_time, serialize_time, total):
+    """Observe and log one served request, return its X-Query-Count and Server-Timing headers."""
+    request_seconds.observe((method, route, str(status)), total)
+    db_seconds.observe((method, route), db_time)
+    query_count.observe((method, route), queries)
+    logger.info(json.dumps({
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "queries": queries,
+        "db_ms": round(db_time * 1000, 2),
+        "serialize_ms": round(serialize_time * 1000, 2),
+        "total_ms": round(total * 1000, 2),
+    }))
+    return {
+        "X-Query-Count": str(queries),
+        "Server-Timing": (f'db;dur={db_time * 1000:.2f};desc="{queries} queries", '
+                          f"serialize;dur={serialize_time * 1000:.2f}, "
+                          f"total;dur={total * 1000:.2f}"),
+    }
+
+
+def setup_instrumentation(app):
+    event.listen(Engine, "before_cursor_execute", before_query)
+    event.listen(Engine, "after_cursor_execute", after_query)
+    event.listen(Engine, "handle_error", failed_query)
+    app.json.dumps = timed_serialization(app.json.dumps)
+    app.json.response = timed_serialization(app.json.response)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(os.getenv("REQUEST_LOG_LEVEL", "INFO"))
+        logger.propagate = False
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def add_timings(response):
+        total = time.perf_counter() - g.get("request_start", time.perf_counter())
+        queries, db_time, serialize_time = g.get("query_count", 0), g.get("db_time", 0.0), g.get("serialize_time", 0.0)
+        response.headers.update(record_request(request.method, request.path, route_label(), response.status_code,
+                                               queries, db_time, serialize_time, total))
+        return response
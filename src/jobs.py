@@ -0,0 +1,179 @@
+"""
+Background jobs stored in the `job` table and run by a separate worker process:
+
+    $ flask run-jobs            # or `pipenv run worker`, see the Procfile
+
+Web requests only enqueue a job and answer 202, the worker claims queued jobs,
+reports their progress, retries failures with exponential backoff and keeps
+its SWAPI traffic under SWAPI_RATE_LIMIT. A job left running by a worker that
+died is picked up again once its lease expires.
+
+    JOB_POLL_SECONDS     idle wait between queue checks (1)
+    JOB_MAX_ATTEMPTS     attempts before a job is marked failed (5)
+    JOB_BACKOFF_SECONDS  delay before the first retry, doubled on each one (5)
+    JOB_BACKOFF_MAX      longest delay between retries (300)
+    JOB_LEASE_SECONDS    time a running job is reserved to its worker (300)
+    JOB_WORKER_IN_PROCESS  1 runs the worker in a thread of each web process,
+                         for hosts without a separate worker process (0)
+
+The in process worker starts on the first request a process serves and dies
+with it, a job it leaves running is retried once its lease expires.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, select, update
+from models import db, Job, People, Planet
+import swapi
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", 5))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 300))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_WORKER_IN_PROCESS = os.getenv("JOB_WORKER_IN_PROCESS", "0") == "1"
+
+ACTIVE = ("queued", "running")
+
+logger = logging.getLogger("api.jobs")
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def populate(model, resource, fields, message):
+    def run(job, progress):
+        limiter = swapi.RateLimiter()
+        records = swapi.fetch_all(resource, limiter=limiter, progress=progress)
+        result = swapi.sync(db.session, model, fields, records)
+        return {"message": message, **result}
+    return run
+
+
+# job kind -> callable(job, progress) returning the job result, run inside an app context
+JOB_KINDS = {
+    "population-people": populate(People, "people", swapi.PEOPLE_FIELDS,
+                                  "Los personajes se sincronizaron exitosamente"),
+    "population-planet": populate(Planet, "planets", swapi.PLANET_FIELDS,
+                                  "Los planets se sincronizaron exitosamente"),
+}
+
+
+def enqueue(kind):
+    """Queue a `kind` job and return it, or the job of that kind already waiting or running.
+
+    Commits the session.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind}")
+    job = Job.query.filter(Job.kind == kind, Job.status.in_(ACTIVE)).order_by(Job.id).first()
+    if job is None:
+        now = utcnow()
+        job = Job(kind=kind, status="queued", attempts=0, max_attempts=JOB_MAX_ATTEMPTS, progress=0,
+                  run_after=now, created_at=now)
+        db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim(worker_id):
+    """Reserve the oldest job that is due, or one whose worker's lease ran out. Returns its id or None."""
+    now = utcnow()
+    due = or_(
+        (Job.status == "queued") & (Job.run_after <= now),
+        (Job.status == "running") & (Job.locked_until < now),
+    )
+    for job_id, status in db.session.execute(select(Job.id, Job.status).where(due).order_by(Job.run_after).limit(10)):
+        # compare and set, only one worker wins a job even without row locks (SQLite)
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == status, due)
+            .values(status="running", attempts=Job.attempts + 1, started_at=now, error=None,
+                    locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed.rowcount == 1:
+            logger.info("worker %s claimed job %s", worker_id, job_id)
+            return job_id
+    return None
+
+
+def backoff(attempts):
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    # jitter, so jobs failing together don't retry together
+    return delay * random.uniform(0.5, 1)
+
+
+def run_job(job_id):
+    job = db.session.get(Job, job_id)
+
+    def progress(done, total):
+        job.progress, job.total = done, total
+        job.locked_until = utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+        db.session.commit()
+
+    try:
+        result = JOB_KINDS[job.kind](job, progress)
+        job.status, job.result, job.finished_at, job.locked_until = "succeeded", result, utcnow(), None
+        db.session.commit()
+    except Exception as err:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.error, job.locked_until = repr(err), None
+        if job.attempts < job.max_attempts:
+            job.status = "queued"
+            job.run_after = utcnow() + timedelta(seconds=backoff(job.attempts))
+        else:
+            job.status, job.finished_at = "failed", utcnow()
+        db.session.commit()
+        logger.warning("job %s attempt %s failed: %r", job_id, job.attempts, err)
+    return job
+
+
+def run_worker(once=False):
+    """Run queued jobs until SIGTERM/SIGINT, or until the queue has nothing due when `once`."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+    stopping = []
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            # finish the current job, then exit
+            signal.signal(signum, lambda *args: stopping.append(True))
+
+    while not stopping:
+        job_id = claim(worker_id)
+        if job_id is None:
+            db.session.remove()
+            if once:
+                return
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+        job = run_job(job_id)
+        logger.info("job %s %s", job_id, job.status)
+        db.session.remove()
+
+
+worker_pid = None
+worker_lock = threading.Lock()
+
+
+def start_worker_thread(app):
+    """Run the worker in a daemon thread of this process, once per process (gunicorn forks)."""
+    global worker_pid
+    if worker_pid == os.getpid():
+        return
+    with worker_lock:
+        if worker_pid == os.getpid():
+            return
+        worker_pid = os.getpid()
+
+    def run():
+        with app.app_context():
+            run_worker()
+    threading.Thread(target=run, name="job-worker", daemon=True).start()
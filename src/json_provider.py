@@ -0,0 +1,57 @@
+"""
+Faster JSON encoding for responses, using orjson when it is installed
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib provider is the fallback
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's default provider, encoded by orjson.
+
+    Dates still go through `default` (HTTP dates), and whatever orjson refuses, such as
+    integers above 64 bits, is encoded by the stdlib provider. One difference is left:
+    NaN and Infinity come out as null instead of the stdlib's non standard literals.
+    """
+
+    def _option(self, sort_keys=None):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop("sort_keys", None)
+        # orjson output is always compact, so is the stdlib fallback unless asked otherwise
+        separators = kwargs.pop("separators", (",", ":"))
+        if kwargs:
+            # indent and other stdlib only arguments
+            return super().dumps(obj, sort_keys=self.sort_keys if sort_keys is None else sort_keys, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._option(sort_keys)).decode("utf-8")
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, sort_keys=self.sort_keys if sort_keys is None else sort_keys,
+                                 separators=separators)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self._option() | orjson.OPT_APPEND_NEWLINE)
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def setup_json(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -1,9 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
+from replicas import RoutingSession
+import math
+from collections import defaultdict
 from enum import Enum
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
+def parse_number(value):
+    """SWAPI numeric strings ("1,358", "unknown", "n/a") as float, None when not a number."""
+    if value is None:
+        return None
+    try:
+        number = float(str(value).replace(",", "").strip())
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+# Legacy association table, favorites are now owned through favorite.user_id alone.
+# Nothing reads it or adds rows to it any more; deleting a favorite still deletes its
+# rows here (their foreign key would block it) until a follow up migration drops the table.
 user_favorites = db.Table( 
     'user_favorites', 
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True), 
@@ -15,7 +33,7 @@ class User(db.Model):
     fullname = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(80), nullable=False)
 
-    favorites = db.relationship('Favorite', secondary=user_favorites, back_populates='users')
+    favorites = db.relationship('Favorite', back_populates='user')
 
 
     def serialize(self):
@@ -30,15 +48,33 @@ class User(db.Model):
 
 class People(db.Model):
     id = db.Column(db.Integer(), primary_key=True)
-    name = db.Column(db.String(80), nullable=False)
+    name = db.Column(db.String(80), nullable=False, index=True)
     height=db.Column(db.String(80)) 
     mass=db.Column(db.String(80)) 
-    hair_color=db.Column(db.String(80))
-    skin_color=db.Column(db.String(80)) 
-    eye_color=db.Column(db.String(80)) 
+    hair_color=db.Column(db.String(80), index=True)
+    skin_color=db.Column(db.String(80), index=True)
+    eye_color=db.Column(db.String(80), index=True)
     birth_year=db.Column(db.String(80)) 
-    gender=db.Column(db.String(80)) 
+    gender=db.Column(db.String(80), index=True)
+    swapi_url=db.Column(db.String(255), unique=True, index=True)
+    content_hash=db.Column(db.String(40))
+    # typed copies of the numeric attributes, NULL when SWAPI says unknown or n/a
+    height_num=db.Column(db.Float(), index=True)
+    mass_num=db.Column(db.Float(), index=True)
+
+    # numeric attribute -> typed shadow column, used for sort= and min_/max_ filters
+    numeric_fields = {"height": "height_num", "mass": "mass_num"}
 
+    # columns accepted as exact match filters on /people, each one is indexed
+    filter_fields = ("gender", "eye_color", "hair_color", "skin_color")
+
+    # columns returned by serialize(), in the same order
+    serialize_fields = ["id", "name", "height", "mass", "hair_color", "skin_color", "eye_color", "birth_year", "gender"]
+
+    @validates("height", "mass")
+    def fill_numeric(self, key, value):
+        setattr(self, self.numeric_fields[key], parse_number(value))
+        return value
 
     def serialize(self):
         return {
@@ -56,16 +92,42 @@ class People(db.Model):
 
 class Planet(db.Model):
     id = db.Column(db.Integer(), primary_key=True)
-    name=db.Column(db.String(80), nullable=False)
+    name=db.Column(db.String(80), nullable=False, index=True)
     rotation_period=db.Column(db.String(80))
     orbital_period=db.Column(db.String(80))
     diameter=db.Column(db.String(80))
-    climate=db.Column(db.String(80))
+    climate=db.Column(db.String(80), index=True)
     gravity=db.Column(db.String(80))
-    terrain=db.Column(db.String(80))
+    terrain=db.Column(db.String(80), index=True)
     surface_water=db.Column(db.String(80))
     population=db.Column(db.String(80))
+    swapi_url=db.Column(db.String(255), unique=True, index=True)
+    content_hash=db.Column(db.String(40))
+    # typed copies of the numeric attributes, NULL when SWAPI says unknown or n/a
+    rotation_period_num=db.Column(db.Float(), index=True)
+    orbital_period_num=db.Column(db.Float(), index=True)
+    diameter_num=db.Column(db.Float(), index=True)
+    population_num=db.Column(db.Float(), index=True)
+
+    # numeric attribute -> typed shadow column, used for sort= and min_/max_ filters
+    numeric_fields = {
+        "rotation_period": "rotation_period_num",
+        "orbital_period": "orbital_period_num",
+        "diameter": "diameter_num",
+        "population": "population_num",
+    }
 
+    # columns accepted as exact match filters on /planets, each one is indexed
+    filter_fields = ("climate", "terrain")
+
+    # columns returned by serialize(), in the same order
+    serialize_fields = ["id", "name", "rotation_period", "orbital_period", "diameter", "climate", "gravity",
+                        "terrain", "surface_water", "population"]
+
+    @validates("rotation_period", "orbital_period", "diameter", "population")
+    def fill_numeric(self, key, value):
+        setattr(self, self.numeric_fields[key], parse_number(value))
+        return value
 
     def serialize(self):
         return {
@@ -88,23 +150,241 @@ class Nature(Enum):
 
 
 class Favorite(db.Model):
+    __table_args__ = (
+        # also serves the per user lookups on user_id, its leading column
+        db.Index("ix_favorite_user_nature", "user_id", "nature", "nature_id", unique=True),
+        db.Index("ix_favorite_nature", "nature", "nature_id"),
+    )
+
     id = db.Column(db.Integer(), primary_key=True)
     nature = db.Column(db.Enum(Nature), nullable=False)
     nature_id = db.Column(db.Integer(), nullable=False)
     user_id = db.Column(db.Integer(), db.ForeignKey("user.id"), nullable=False)
 
-    users = db.relationship('User', secondary=user_favorites, back_populates='favorites')
+    user = db.relationship('User', back_populates='favorites')
 
     def serialize(self):
         return {
             "id": self.id,
             "nature": self.nature.value,
             "nature_id": self.nature_id,
-            "user_id": self.nature_id,
+            "user_id": self.user_id,
           
             
         }
 
-    
+
+class FavoriteCount(db.Model):
+    """How many users have each People/Planet as favorite, kept in step with Favorite."""
+    __tablename__ = "favorite_count"
+    __table_args__ = (
+        db.Index("ix_favorite_count_nature_count", "nature", "count"),
+    )
+
+    nature = db.Column(db.Enum(Nature), primary_key=True)
+    nature_id = db.Column(db.Integer(), primary_key=True)
+    count = db.Column(db.Integer(), nullable=False, default=0)
+
+    def serialize(self):
+        return {
+            "nature": self.nature.value,
+            "nature_id": self.nature_id,
+            "count": self.count,
+        }
+
+
+class TableVersion(db.Model):
+    __tablename__ = "table_version"
+    table_name = db.Column(db.String(80), primary_key=True)
+    version = db.Column(db.Integer(), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime())
+
+
+class Job(db.Model):
+    """Background job run by the worker process (see jobs.py), times are naive UTC."""
+    __table_args__ = (
+        db.Index("ix_job_status_run_after", "status", "run_after"),
+    )
+
+    id = db.Column(db.Integer(), primary_key=True)
+    kind = db.Column(db.String(80), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer(), nullable=False, default=0)
+    max_attempts = db.Column(db.Integer(), nullable=False, default=5)
+    progress = db.Column(db.Integer(), nullable=False, default=0)
+    total = db.Column(db.Integer())
+    result = db.Column(db.JSON())
+    error = db.Column(db.Text())
+    run_after = db.Column(db.DateTime(), nullable=False)
+    locked_until = db.Column(db.DateTime())
+    created_at = db.Column(db.DateTime(), nullable=False)
+    started_at = db.Column(db.DateTime())
+    finished_at = db.Column(db.DateTime())
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "progress": self.progress,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "run_after": self.run_after.isoformat() if self.run_after else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+NATURE_MODELS = {Nature.PEOPLE: People, Nature.PLANET: Planet}
+
+
+def hydrate_favorites(favorites):
+    """Serialize `favorites` with the People/Planet record each one points to.
+
+    Runs one IN query per nature instead of one lookup per favorite.
+    """
+    ids = defaultdict(set)
+    for favorite in favorites:
+        ids[favorite.nature].add(favorite.nature_id)
+
+    records = {}
+    for nature, nature_ids in ids.items():
+        model = NATURE_MODELS[nature]
+        for item in model.query.filter(model.id.in_(nature_ids)):
+            records[(nature, item.id)] = item.serialize()
+
+    return [
+        {**favorite.serialize(), "record": records.get((favorite.nature, favorite.nature_id))}
+        for favorite in favorites
+    ]
+
+
+
+def apply_favorite_operations(user_id, operations):
+    """Add or remove many favorites of one user with set based queries.
+
+    `operations` is a list of {"op": "add"|"remove", "nature": "people"|"planet", "nature_id": int}.
+    Returns one result per operation; nothing is committed here.
+    """
+    results = [None] * len(operations)
+    parsed = []
+    for index, operation in enumerate(operations):
+        try:
+            action = operation.get("op", "add")
+            nature = Nature[str(operation["nature"]).upper()]
+            nature_id = int(operation["nature_id"])
+            if action not in ("add", "remove"):
+                raise ValueError(action)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            results[index] = {"index": index, "status": "invalid"}
+            continue
+        parsed.append((index, action, nature, nature_id))
+
+    # one IN query per nature for the referenced records, one for the user's current favorites
+    wanted = defaultdict(set)
+    for index, action, nature, nature_id in parsed:
+        wanted[nature].add(nature_id)
+    found = set()
+    for nature, nature_ids in wanted.items():
+        model = NATURE_MODELS[nature]
+        found.update((nature, row_id) for row_id, in db.session.query(model.id).filter(model.id.in_(nature_ids)))
+    current = {
+        (nature, nature_id): favorite_id
+        for favorite_id, nature, nature_id in db.session.query(Favorite.id, Favorite.nature, Favorite.nature_id)
+        .filter(Favorite.user_id == user_id)
+    }
+
+    inserts, removed, removed_keys = [], [], []
+    for index, action, nature, nature_id in parsed:
+        key = (nature, nature_id)
+        result = {"index": index, "op": action, "nature": nature.value, "nature_id": nature_id}
+        if action == "add":
+            if key not in found:
+                result["status"] = "not_found"
+            elif key in current:
+                result["status"] = "already_favorite"
+            else:
+                inserts.append({"nature": nature, "nature_id": nature_id, "user_id": user_id})
+                current[key] = None
+                result["status"] = "added"
+        elif key in current:
+            favorite_id = current.pop(key)
+            if favorite_id is None:
+                # added earlier in this same batch
+                inserts = [row for row in inserts if (row["nature"], row["nature_id"]) != key]
+            else:
+                removed.append(favorite_id)
+                removed_keys.append((favorite_id,) + key)
+            result["status"] = "removed"
+        else:
+            result["status"] = "not_favorite"
+        results[index] = result
+
+    deltas = defaultdict(int)
+    for row in inserts:
+        deltas[(row["nature"], row["nature_id"])] += 1
+    for favorite_id, nature, nature_id in removed_keys:
+        deltas[(nature, nature_id)] -= 1
+
+    # deletes first, a batch may remove a favorite and add it back
+    if removed:
+        db.session.execute(user_favorites.delete().where(user_favorites.c.favorite_id.in_(removed)))
+        db.session.execute(db.delete(Favorite).where(Favorite.id.in_(removed)))
+    if inserts:
+        db.session.execute(db.insert(Favorite), inserts)
+    apply_count_deltas(db.session.connection(), deltas)
+    return results
+
+
+def apply_count_deltas(connection, deltas):
+    """Add `deltas` ({(nature, nature_id): delta}) to the favorite counters with one upsert."""
+    rows = [
+        {"nature": nature, "nature_id": nature_id, "count": delta}
+        for (nature, nature_id), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(FavoriteCount.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["nature", "nature_id"],
+            set_={"count": FavoriteCount.__table__.c.count + stmt.excluded["count"]},
+        )
+        connection.execute(stmt, rows)
+    elif dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(FavoriteCount.__table__)
+        stmt = stmt.on_duplicate_key_update(count=FavoriteCount.__table__.c.count + stmt.inserted["count"])
+        connection.execute(stmt, rows)
+    else:
+        table = FavoriteCount.__table__
+        for row in rows:
+            result = connection.execute(
+                table.update()
+                .where(table.c.nature == row["nature"], table.c.nature_id == row["nature_id"])
+                .values(count=table.c.count + row["count"])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
 
 
+def rebuild_favorite_counts():
+    """Recompute every favorite counter from the favorite table in two statements."""
+    table = FavoriteCount.__table__
+    db.session.execute(table.delete())
+    db.session.execute(
+        table.insert().from_select(
+            ["nature", "nature_id", "count"],
+            db.select(Favorite.nature, Favorite.nature_id, db.func.count(Favorite.id))
+            .group_by(Favorite.nature, Favorite.nature_id),
+        )
+    )
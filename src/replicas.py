@@ -0,0 +1,72 @@
+"""
+Read replica routing.
+
+DATABASE_REPLICA_URLS holds a comma separated list of replica urls. Reads made
+while serving GET/HEAD requests go to one of them; writes, flushes and every
+other request use the primary DATABASE_URL. A client that just wrote gets a
+short lived cookie that keeps its own reads on the primary for
+REPLICA_STICKY_SECONDS, so it always reads its writes back.
+"""
+import os
+import random
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.sql.dml import UpdateBase
+from pool import engine_options
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+STICKY_COOKIE = "db_primary_until"
+
+# GET endpoints that write, always served by the primary
+primary_endpoints = set()
+
+
+def use_primary(view):
+    primary_endpoints.add(view.__name__)
+    return view
+
+
+def replica_urls():
+    urls = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [url.strip().replace("postgres://", "postgresql://") for url in urls.split(",") if url.strip()]
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.reads_from_replica(clause):
+            return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def reads_from_replica(self, clause):
+        if not has_request_context() or g.get("db_replica") is None:
+            return False
+        if self._flushing or isinstance(clause, UpdateBase) or self.info.get("wrote"):
+            # once this transaction wrote, its reads must see the write
+            self.info["wrote"] = True
+            return False
+        return True
+
+
+def setup_replicas(app):
+    engines = [create_engine(url, **engine_options(url)) for url in replica_urls()]
+    app.extensions["db_replicas"] = engines
+    if not engines:
+        return
+
+    @app.before_request
+    def route_reads():
+        sticky = request.cookies.get(STICKY_COOKIE, "")
+        recently_wrote = sticky.replace(".", "", 1).isdigit() and float(sticky) > time.time()
+        if (request.method in ("GET", "HEAD") and request.endpoint not in primary_endpoints
+                and not recently_wrote):
+            g.db_replica = random.choice(engines)
+
+    @app.after_request
+    def stick_writers(response):
+        wrote = request.method not in ("GET", "HEAD", "OPTIONS") or request.endpoint in primary_endpoints
+        if wrote and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, str(time.time() + REPLICA_STICKY_SECONDS),
+                                max_age=int(REPLICA_STICKY_SECONDS) + 1, httponly=True)
+        return response
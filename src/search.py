@@ -0,0 +1,86 @@
+"""
+Attribute filters, numeric ranges, sorting and name search for the /people and
+/planets listings, pushed down to SQL and backed by the indexes created in
+migrations 4545e9329b5d and 6da9d8ce901a.
+"""
+from sqlalchemy import inspect, select, text
+from utils import APIException
+
+SEARCH_ARGS = ("search",)
+
+# (database url, fts table) -> whether the table exists
+fts_tables = {}
+
+
+def fts_table(model):
+    return f"{model.__tablename__}_fts"
+
+
+def has_fts(session, model):
+    """True when the SQLite FTS5 index for `model` exists, cached per engine."""
+    bind = session.get_bind()
+    key = (str(bind.url), fts_table(model))
+    if key not in fts_tables:
+        fts_tables[key] = inspect(bind).has_table(key[1])
+    return fts_tables[key]
+
+
+def fts_query(term):
+    # every word becomes a quoted prefix query, so user input never reaches the FTS syntax
+    words = [word.replace('"', '""') for word in term.split()]
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def name_condition(session, model, term):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        # both operators are served by the pg_trgm GIN index, % also matches typos
+        return model.name.ilike(f"%{term}%") | model.name.op("%")(term)
+    if dialect == "sqlite" and has_fts(session, model):
+        matches = select(text("rowid")).select_from(text(fts_table(model))) \
+            .where(text(f"{fts_table(model)} MATCH :fts_query")).params(fts_query=fts_query(term))
+        return model.id.in_(matches)
+    # prefix LIKE can still use the plain name index
+    return model.name.like(f"{term}%")
+
+
+def list_conditions(session, model, args):
+    """SQL conditions for the filter and `search` query parameters of a listing."""
+    conditions = []
+    for field in getattr(model, "filter_fields", ()):
+        if field in args:
+            values = [value.strip() for value in args[field].split(",") if value.strip()]
+            conditions.append(getattr(model, field).in_(values))
+    term = args.get("search", "").strip()
+    if "search" in args and not term:
+        raise APIException("search must not be empty", status_code=400)
+    if term:
+        conditions.append(name_condition(session, model, term))
+    for field, shadow in getattr(model, "numeric_fields", {}).items():
+        column = getattr(model, shadow)
+        for prefix, compare in (("min_", column.__ge__), ("max_", column.__le__)):
+            if prefix + field in args:
+                try:
+                    bound = float(args[prefix + field])
+                except ValueError:
+                    raise APIException(f"{prefix}{field} must be a number", status_code=400)
+                conditions.append(compare(bound))
+    return conditions
+
+
+def list_sort(model, args):
+    """The (typed column, descending) pair asked for by `sort=field` or `sort=-field`, or None."""
+    sort = args.get("sort")
+    if not sort:
+        return None
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    numeric_fields = getattr(model, "numeric_fields", {})
+    if field not in numeric_fields:
+        raise APIException(f"sort must be one of: {', '.join(numeric_fields)}", status_code=400)
+    return getattr(model, numeric_fields[field]), descending
+
+
+def is_filtered(model, args):
+    range_args = tuple(prefix + field for field in getattr(model, "numeric_fields", {}) for prefix in ("min_", "max_"))
+    return any(key in args for key in getattr(model, "filter_fields", ()) + SEARCH_ARGS + range_args + ("sort",))
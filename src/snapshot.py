@@ -0,0 +1,195 @@
+"""
+Precomputed snapshot of the /people and /planets catalog.
+
+With SNAPSHOT_DIR set, every commit that writes People or Planet rebuilds the
+full list response of that table: the JSON bytes plus their gzip and brotli
+versions, written as `<table>-<version>.json[.gz|.br]` next to a small
+`<table>.json` pointer naming the current version. Workers mmap the files and
+notice a new pointer with a stat() per request, so a list request runs no SQL
+and no JSON encoding. Requests with query parameters still go to the database.
+
+Writers that don't rebuild into this SNAPSHOT_DIR (the job worker on another
+host, `flask db upgrade`, other servers) are caught by comparing the pointer
+with `table_version` at most every SNAPSHOT_CHECK_SECONDS (2).
+"""
+import fcntl
+import glob
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import select
+from compression import COMPRESS_MIN_SIZE, available_encodings, choose_encoding, compress
+from models import db, People, Planet, TableVersion
+from utils import serialize_rows
+import versions
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", 2))
+SUFFIXES = {None: "", "gzip": ".gz", "br": ".br"}
+MODELS = {People.__tablename__: People, Planet.__tablename__: Planet}
+
+
+class Snapshot:
+    """The files of one table version, mapped read only."""
+
+    def __init__(self, directory, table, state):
+        self.version = state["version"]
+        self.etag = state["etag"]
+        self.last_modified = datetime.fromisoformat(state["last_modified"]) if state["last_modified"] else None
+        self.bodies = {}
+        for encoding in state["encodings"]:
+            with open(data_path(directory, table, self.version, encoding), "rb") as data:
+                self.bodies[encoding] = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def body(self, encoding):
+        return self.bodies[encoding][:]
+
+
+class SnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        # table -> (pointer stat key, Snapshot)
+        self.loaded = {}
+        # table -> time.monotonic() of its last check against table_version
+        self.validated = {}
+
+    def pointer_path(self, table):
+        return os.path.join(self.directory, f"{table}.json")
+
+    def publish(self, table, state):
+        """Point `table` at `state` unless a newer version is already published, then drop older files.
+
+        Holds a lock file, so builds of several processes never publish or delete out of order.
+        """
+        with open(os.path.join(self.directory, f"{table}.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self.read_pointer(table)
+            if current is None or current["version"] <= state["version"]:
+                write_atomic(self.pointer_path(table), json.dumps(state).encode("utf-8"))
+                current = state
+            pattern = re.compile(rf"{re.escape(table)}-(\d+)\.json")
+            for path in glob.glob(os.path.join(self.directory, f"{table}-*.json*")):
+                match = pattern.match(os.path.basename(path))
+                # a build in progress may still be writing newer files or temporaries, leave them alone
+                if match and int(match.group(1)) < current["version"] and not path.endswith(".tmp"):
+                    os.remove(path)
+
+    def build(self, app, table):
+        """Serialize and compress `table` and publish it as the current snapshot."""
+        model = MODELS[table]
+        with db.engine.connect() as connection:
+            version = connection.execute(
+                select(TableVersion.version).where(TableVersion.table_name == table)).scalar() or 0
+            etag, last_modified = versions.table_state(connection, [table])
+            data = (app.json.dumps(serialize_rows(connection, model)) + "\n").encode("utf-8")
+
+        encodings = [None] + [encoding for encoding in available_encodings() if len(data) >= COMPRESS_MIN_SIZE]
+        for encoding in encodings:
+            write_atomic(data_path(self.directory, table, version, encoding),
+                         data if encoding is None else compress(data, encoding))
+        state = {"version": version, "etag": etag, "encodings": encodings,
+                 "last_modified": last_modified.isoformat() if last_modified else None}
+        self.publish(table, state)
+
+    def read_pointer(self, table):
+        try:
+            with open(self.pointer_path(table), "rb") as pointer:
+                return json.load(pointer)
+        except (OSError, ValueError):
+            return None
+
+    def current(self, table):
+        """Return the current Snapshot of `table`, loading or building it if needed, or None."""
+        try:
+            if time.monotonic() - self.validated.get(table, float("-inf")) >= SNAPSHOT_CHECK_SECONDS:
+                with self.lock:
+                    state = self.read_pointer(table)
+                    latest = db.session.execute(
+                        select(TableVersion.version).where(TableVersion.table_name == table)).scalar() or 0
+                    if state is None or state["version"] != latest:
+                        self.build(current_app._get_current_object(), table)
+                    self.validated[table] = time.monotonic()
+            info = os.stat(self.pointer_path(table))
+            key = (info.st_ino, info.st_mtime_ns)
+            loaded = self.loaded.get(table)
+            if loaded is None or loaded[0] != key:
+                with self.lock:
+                    state = self.read_pointer(table)
+                    if state is None:
+                        return None
+                    loaded = self.loaded[table] = (key, Snapshot(self.directory, table, state))
+            return loaded[1]
+        except OSError:
+            # a snapshot replaced between stat() and open(), the database answers this one
+            current_app.logger.warning("snapshot of %s unavailable", table, exc_info=True)
+            return None
+
+    def rebuild(self, app, tables):
+        for table in tables & MODELS.keys():
+            try:
+                self.build(app, table)
+            except Exception:
+                # never leave a stale snapshot published, readers fall back to the database
+                app.logger.exception("could not rebuild the %s snapshot", table)
+                try:
+                    os.remove(self.pointer_path(table))
+                except OSError:
+                    pass
+                self.validated.pop(table, None)
+
+
+store = None
+
+
+def data_path(directory, table, version, encoding):
+    return os.path.join(directory, f"{table}-{version}.json{SUFFIXES[encoding]}")
+
+
+def write_atomic(path, data):
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "wb") as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+
+def snapshot_list(table):
+    """Serve the full list of `table` from its snapshot when there are no query parameters."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            snapshot = store.current(table) if store is not None and not request.args else None
+            if snapshot is None:
+                return view(*args, **kwargs)
+            fresh = versions.fresh_etag(snapshot.etag, snapshot.last_modified)
+            if fresh is not None:
+                return versions.not_modified(fresh, snapshot.last_modified)
+
+            encoding = choose_encoding(request.accept_encodings)
+            if encoding not in snapshot.bodies:
+                encoding = None
+            response = current_app.response_class(snapshot.body(encoding), mimetype="application/json")
+            response.vary.add("Accept-Encoding")
+            response.set_etag(snapshot.etag if encoding is None else f"{snapshot.etag}-{encoding}")
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+            if snapshot.last_modified is not None:
+                response.last_modified = snapshot.last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def setup_snapshot(app, directory=SNAPSHOT_DIR):
+    global store
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    store = SnapshotStore(directory)
+    versions.commit_listeners.append(lambda tables: store.rebuild(app, tables))
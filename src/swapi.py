@@ -0,0 +1,159 @@
+"""
+Client for the SWAPI catalog used by the population jobs
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert, select, update
+from models import parse_number
+
+SWAPI_BASE_URL = os.getenv("SWAPI_BASE_URL", "https://swapi.dev/api")
+SWAPI_MAX_WORKERS = int(os.getenv("SWAPI_MAX_WORKERS", 8))
+SWAPI_TIMEOUT = float(os.getenv("SWAPI_TIMEOUT", 10))
+# requests per second toward SWAPI from the job worker, 0 disables the limit
+SWAPI_RATE_LIMIT = float(os.getenv("SWAPI_RATE_LIMIT", 5))
+BATCH_SIZE = 500
+
+PEOPLE_FIELDS = ["name", "height", "mass", "hair_color", "skin_color", "eye_color", "birth_year", "gender"]
+PLANET_FIELDS = ["name", "rotation_period", "orbital_period", "diameter", "climate", "gravity",
+                 "terrain", "surface_water", "population"]
+
+
+def make_session(pool_size=SWAPI_MAX_WORKERS):
+    # imported here, only the population endpoints need an HTTP client
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class RateLimiter:
+    """Token bucket shared by the threads of one process: `rate` requests per second, bursts of `burst`."""
+
+    def __init__(self, rate=SWAPI_RATE_LIMIT, burst=None):
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_page(http, url, page=None, limiter=None):
+    if limiter is not None:
+        limiter.acquire()
+    response = http.get(url, params={"page": page} if page else None, timeout=SWAPI_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_all(resource, http=None, max_workers=SWAPI_MAX_WORKERS, limiter=None, progress=None):
+    """Return every record of `resource`, fetching the pages after the first one in parallel.
+
+    `limiter` throttles the requests, `progress(pages_done, pages_total)` is called after each page.
+    """
+    http = http or make_session(max_workers)
+    progress = progress or (lambda done, total: None)
+    url = f"{SWAPI_BASE_URL.rstrip('/')}/{resource}/"
+    first = get_page(http, url, 1, limiter)
+    results = list(first["results"])
+    if not first.get("next"):
+        progress(1, 1)
+        return results
+
+    if "count" not in first or not results:
+        # no way to know the page count up front, follow the next links
+        next_url, done = first["next"], 1
+        progress(done, None)
+        while next_url:
+            page = get_page(http, next_url, limiter=limiter)
+            results.extend(page["results"])
+            next_url, done = page.get("next"), done + 1
+            progress(done, None if next_url else done)
+        return results
+
+    pages = math.ceil(first["count"] / len(first["results"]))
+    progress(1, pages)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for done, page in enumerate(pool.map(lambda number: get_page(http, url, number, limiter),
+                                             range(2, pages + 1)), start=2):
+            results.extend(page["results"])
+            progress(done, pages)
+    return results
+
+
+def content_hash(record, fields):
+    payload = json.dumps([record.get(field) for field in fields])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def sync(session, model, fields, records, batch_size=BATCH_SIZE):
+    """Upsert `records` by their SWAPI url, only writing rows whose content changed.
+
+    Returns the number of inserted, updated and unchanged rows.
+    """
+    incoming, anonymous = {}, []
+    for record in records:
+        row = {field: record.get(field) for field in fields}
+        for field, shadow in getattr(model, "numeric_fields", {}).items():
+            row[shadow] = parse_number(row.get(field))
+        row["swapi_url"] = record.get("url")
+        row["content_hash"] = content_hash(record, fields)
+        if row["swapi_url"] is None:
+            anonymous.append(row)
+        else:
+            incoming[row["swapi_url"]] = row
+
+    urls = list(incoming)
+    existing = {}
+    for start in range(0, len(urls), batch_size):
+        chunk = urls[start:start + batch_size]
+        stmt = select(model.id, model.swapi_url, model.content_hash).where(model.swapi_url.in_(chunk))
+        for row_id, url, row_hash in session.execute(stmt):
+            existing[url] = (row_id, row_hash)
+
+    # rows created before swapi_url existed are adopted by name instead of inserted again
+    unmatched = {row["name"]: url for url, row in incoming.items() if url not in existing}
+    names = list(unmatched)
+    for start in range(0, len(names), batch_size):
+        chunk = names[start:start + batch_size]
+        stmt = select(model.id, model.name).where(model.swapi_url.is_(None), model.name.in_(chunk)).order_by(model.id)
+        for row_id, name in session.execute(stmt):
+            existing.setdefault(unmatched[name], (row_id, None))
+
+    inserts, updates, unchanged = anonymous, [], 0
+    for url, row in incoming.items():
+        if url not in existing:
+            inserts.append(row)
+        elif existing[url][1] != row["content_hash"]:
+            updates.append(dict(row, id=existing[url][0]))
+        else:
+            unchanged += 1
+
+    for start in range(0, len(inserts), batch_size):
+        session.execute(insert(model), inserts[start:start + batch_size])
+    for start in range(0, len(updates), batch_size):
+        # ORM bulk UPDATE by primary key, one executemany per batch
+        session.execute(update(model), updates[start:start + batch_size])
+
+    return {"inserted": len(inserts), "updated": len(updates), "unchanged": unchanged}
@@ -1,4 +1,5 @@
-from flask import jsonify, url_for
+from flask import current_app, jsonify, url_for
+from sqlalchemy import select
 
 class APIException(Exception):
     status_code = 400
@@ -15,13 +16,92 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def keyset_page(session, model, args, conditions=(), sort=None, default_limit=50, max_limit=500):
+    """Return one page of `model` ordered by id, starting after the `after` cursor.
+
+    `fields` (comma separated) restricts the selected columns at the SQL level,
+    `id` is always included because it is the cursor. `conditions` are extra
+    WHERE clauses, such as the listing filters. `sort` is a (column, descending)
+    pair; the page is then ordered by that column first, rows where it is NULL
+    are left out and the cursor becomes "<value>:<id>".
+    """
+    columns = model.__table__.columns
+    allowed = serialize_fields(model)
+    fields = args.get("fields")
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise APIException(f"Unknown fields: {', '.join(unknown)}", status_code=400)
+        if "id" not in names:
+            names.insert(0, "id")
+    else:
+        names = allowed
+
+    try:
+        limit = int(args.get("limit", default_limit))
+        if sort is None:
+            after = int(args.get("after", 0))
+        elif "after" in args:
+            after_value, after_id = args["after"].rsplit(":", 1)
+            after_value, after_id = float(after_value), int(after_id)
+    except ValueError:
+        raise APIException("limit must be an integer and after a cursor returned as next", status_code=400)
+    if limit < 1:
+        raise APIException("limit must be greater than 0", status_code=400)
+    limit = min(limit, max_limit)
+
+    selected = [columns[name] for name in names]
+    if sort is None:
+        query = session.query(*selected).filter(model.id > after, *conditions).order_by(model.id)
+    else:
+        column, descending = sort
+        query = session.query(*selected, column).filter(column.isnot(None), *conditions)
+        if "after" in args:
+            beyond = column < after_value if descending else column > after_value
+            query = query.filter(beyond | ((column == after_value) & (model.id > after_id)))
+        query = query.order_by(column.desc() if descending else column, model.id)
+
+    # one extra row tells us whether there is a next page without a COUNT(*)
+    rows = query.limit(limit + 1).all()
+
+    results = [dict(zip(names, row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = results[-1]["id"] if sort is None else f"{last[-1]!r}:{results[-1]['id']}"
+    return {"results": results, "next": next_cursor}
+
+def serialize_fields(model):
+    return getattr(model, "serialize_fields", None) or [column.name for column in model.__table__.columns]
+
+def serialize_rows(session, model):
+    """Same output as [row.serialize() for row in model.query], built from column tuples
+    without materializing ORM instances."""
+    names = serialize_fields(model)
+    columns = model.__table__.columns
+    rows = session.execute(select(*[columns[name] for name in names]).order_by(model.id))
+    return [dict(zip(names, row)) for row in rows]
+
+def export_rows(session, model, chunk_size=500):
+    """Yield one serialized row per line, fetching `chunk_size` rows at a time."""
+    names = serialize_fields(model)
+    columns = model.__table__.columns
+    stmt = select(*[columns[name] for name in names]).order_by(model.id).execution_options(yield_per=chunk_size)
+    dumps = current_app.json.dumps
+    for row in session.execute(stmt):
+        yield dumps(dict(zip(names, row))) + "\n"
+
+def is_paginated(args):
+    return any(key in args for key in ("limit", "after", "fields"))
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -0,0 +1,148 @@
+"""
+Per table version tracking, used for conditional GETs and cache invalidation.
+
+Every commit that writes to a table bumps its row in `table_version` inside
+the same transaction, so all workers agree on the current version.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import Response, current_app, request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, TableVersion
+
+# callables receiving the set of table names written by each commit
+commit_listeners = []
+
+
+def mark_tables(session, tables):
+    tables = set(tables) - {TableVersion.__tablename__}
+    if tables:
+        session.info.setdefault("changed_tables", set()).update(tables)
+
+
+def track_flushed(session, flush_context):
+    instances = list(session.new) + list(session.dirty) + list(session.deleted)
+    mark_tables(session, {instance.__tablename__ for instance in instances})
+
+
+def track_bulk(orm_execute_state):
+    # bulk insert()/update()/delete() statements bypass the unit of work
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            mark_tables(orm_execute_state.session, {mapper.local_table.name})
+
+
+def bump_versions(session):
+    # pending changes are only flushed after before_commit, flush them now to see every table
+    session.flush()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for table in sorted(session.info.get("changed_tables", ())):
+        result = session.execute(
+            update(TableVersion)
+            .where(TableVersion.table_name == table)
+            .values(version=TableVersion.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            session.execute(insert(TableVersion).values(table_name=table, version=1, updated_at=now))
+
+
+def notify_committed(session):
+    tables = session.info.pop("changed_tables", set())
+    if tables:
+        for listener in commit_listeners:
+            listener(tables)
+
+
+def forget_rolled_back(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("changed_tables", None)
+
+
+def forget_versions(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("table_versions", None)
+
+
+def version_rows(session, tables):
+    """Return {table: (version, updated_at)} for the `tables` that have a table_version row."""
+    return dict(
+        (name, (version, updated_at))
+        for name, version, updated_at in session.execute(
+            select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+            .where(TableVersion.table_name.in_(tables))
+        )
+    )
+
+
+def current_versions(session, tables):
+    """version_rows for a Session, remembered until its transaction ends, so the ETag
+    and the cache keys of one request come from the same read."""
+    known = session.info.setdefault("table_versions", {})
+    missing = [table for table in tables if table not in known]
+    if missing:
+        rows = version_rows(session, missing)
+        known.update((table, rows.get(table, (0, None))) for table in missing)
+    return {table: known[table] for table in tables}
+
+
+def table_state(session, tables, rows=None):
+    """Return the strong ETag and Last-Modified datetime (or None) for `tables`."""
+    rows = version_rows(session, tables) if rows is None else rows
+    fingerprint = ",".join(f"{table}:{rows.get(table, (0, None))[0]}" for table in sorted(tables))
+    etag = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+    modified = [updated_at for version, updated_at in rows.values() if updated_at is not None]
+    last_modified = max(modified).replace(tzinfo=timezone.utc, microsecond=0) if modified else None
+    return etag, last_modified
+
+
+def fresh_etag(etag, last_modified):
+    """Return the ETag to send back with a 304 if the client's copy is current, else None."""
+    if request.if_none_match:
+        # compressed variants carry the encoding as a suffix, e.g. "<etag>-gzip"
+        matches = [tag for tag in (etag, f"{etag}-gzip", f"{etag}-br") if request.if_none_match.contains(tag)]
+        return matches[0] if matches else None
+    if (request.if_modified_since is not None and last_modified is not None
+            and last_modified <= request.if_modified_since):
+        return etag
+    return None
+
+
+def not_modified(etag, last_modified):
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def conditional_get(*tables):
+    """Answer If-None-Match / If-Modified-Since with a 304 from the version rows alone,
+    before the view runs any query over `tables`."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = table_state(db.session, tables, current_versions(db.session, tables))
+            fresh = fresh_etag(etag, last_modified)
+            if fresh is not None:
+                return not_modified(fresh, last_modified)
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def setup_versions():
+    event.listen(Session, "after_flush", track_flushed)
+    event.listen(Session, "do_orm_execute", track_bulk)
+    event.listen(Session, "before_commit", bump_versions)
+    event.listen(Session, "after_commit", notify_committed)
+    event.listen(Session, "after_soft_rollback", forget_rolled_back)
+    event.listen(Session, "after_transaction_end", forget_versions)
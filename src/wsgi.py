@@ -1,7 +1,16 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
+#
+# API only workers boot faster with APP_PROFILE=api (no /admin, no `flask db`),
+# set it on the web process alone, the release phase still needs Flask-Migrate:
+#   web: APP_PROFILE=api gunicorn wsgi --chdir ./src/
 
 from app import app as application
+from models import db
+from pool import warm_pool
+
+with application.app_context():
+    warm_pool(db.engine)
 
 if __name__ == "__main__":
     application.run()
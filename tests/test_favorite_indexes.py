@@ -0,0 +1,80 @@
+"""
+The hot favorite queries must be answered from the indexes added by migration
+6cf975b82da2. Checked with EXPLAIN on SQLite, and on PostgreSQL when
+TEST_POSTGRES_URL points to a scratch database (the migrations are run on it).
+
+    $ pipenv run pytest tests
+"""
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import IntegrityError
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from models import Favorite, Nature  # noqa: E402
+
+HOT_QUERIES = {
+    # delete_people_on_fav / delete_planet_on_fav
+    "by item": (select(Favorite).filter_by(nature=Nature.PEOPLE, nature_id=1), "ix_favorite_nature"),
+    # favorites of one user
+    "by user": (select(Favorite).where(Favorite.user_id == 1), "ix_favorite_user_nature"),
+    # duplicate check before adding a favorite
+    "by user and item": (select(Favorite.id).filter_by(user_id=1, nature=Nature.PLANET, nature_id=1),
+                         "ix_favorite_user_nature"),
+}
+
+
+def migrate(url):
+    env = dict(os.environ, DATABASE_URL=url, FLASK_APP="src/app.py", REQUEST_LOG_LEVEL="WARNING")
+    env.pop("SNAPSHOT_DIR", None)
+    subprocess.run([sys.executable, "-m", "flask", "db", "upgrade"], cwd=ROOT, env=env, check=True,
+                   capture_output=True)
+
+
+@pytest.fixture(scope="module", params=["sqlite", "postgresql"])
+def engine(request, tmp_path_factory):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    else:
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL is not set")
+        url = url.replace("postgres://", "postgresql://")
+    migrate(url)
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(connection, stmt):
+    sql = str(stmt.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    if connection.dialect.name == "sqlite":
+        return "\n".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    # on a small table a sequential scan is cheaper, forbid it to see which index the planner can use
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    return "\n".join(row[0] for row in connection.execute(text(f"EXPLAIN {sql}")))
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_indexes(engine, name):
+    stmt, index = HOT_QUERIES[name]
+    with engine.begin() as connection:
+        plan = query_plan(connection, stmt)
+    assert index in plan, plan
+
+
+def test_duplicate_favorite_is_rejected(engine):
+    with engine.begin() as connection:
+        user_id = connection.execute(
+            text("INSERT INTO \"user\" (fullname, email) VALUES ('Test', 'test@example.com') RETURNING id")).scalar()
+    row = {"user_id": user_id, "nature": Nature.PEOPLE.name, "nature_id": 1}
+    insert = text("INSERT INTO favorite (user_id, nature, nature_id) VALUES (:user_id, :nature, :nature_id)")
+    with engine.begin() as connection:
+        connection.execute(insert, row)
+    with pytest.raises(IntegrityError) as error, engine.begin() as connection:
+        connection.execute(insert, row)
+    assert "unique" in str(error.value).lower()
@@ -0,0 +1,66 @@
+"""
+RedisCache against fakeredis: two workers share the server, a commit moves
+the key version so neither reads the payload cached before it.
+
+    $ pipenv run pytest tests
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.pop("SNAPSHOT_DIR", None)
+os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from flask_migrate import upgrade  # noqa: E402
+from app import app  # noqa: E402
+from models import db, People  # noqa: E402
+import cache  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def person():
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        person = People(name="Luke Skywalker", gender="male")
+        db.session.add(person)
+        db.session.commit()
+        return person.id
+
+
+@pytest.fixture
+def workers():
+    """Two workers' backends on one redis server."""
+    server = fakeredis.FakeServer()
+    first, second = (cache.RedisCache(fakeredis.FakeRedis(server=server)) for _ in range(2))
+    return first, second, server
+
+
+def get_as(monkeypatch, backend, path):
+    monkeypatch.setattr(cache, "backend", backend)
+    return app.test_client().get(path)
+
+
+def test_commit_moves_the_key_version(monkeypatch, person, workers):
+    first, second, server = workers
+    path = f"/people/{person}"
+
+    assert get_as(monkeypatch, first, path).json["name"] == "Luke Skywalker"
+    assert get_as(monkeypatch, second, path).json["name"] == "Luke Skywalker"
+    assert (first.misses, second.hits) == (1, 1)
+    keys = set(fakeredis.FakeRedis(server=server).keys("swcache:people:*"))
+
+    with app.app_context():
+        db.session.get(People, person).name = "Luke"
+        db.session.commit()
+
+    response = get_as(monkeypatch, second, path)
+    assert response.json["name"] == "Luke"
+    assert (second.hits, second.misses) == (1, 1)
+    new_keys = set(fakeredis.FakeRedis(server=server).keys("swcache:people:*")) - keys
+    assert len(new_keys) == 1 and new_keys.pop().endswith(f":id:{person}".encode())